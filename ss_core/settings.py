@@ -79,6 +79,15 @@ DATABASES = {
     }
 }
 
+# Shared by every worker and management command: GraphQL responses and their
+# invalidations, YouTube items, cue pairs and the sitemap all live here. The
+# default in-process cache is for development only; with more than one process
+# set CACHE_URL, e.g. memcache://127.0.0.1:11211 or redis://127.0.0.1:6379/1
+# (which needs django-redis).
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/1.9/ref/settings/#auth-password-validators
@@ -168,8 +177,87 @@ AWS_ACCESS_KEY = env('AWS_ACCESS_KEY')
 AWS_SECRET_KEY = env('AWS_SECRET_KEY')
 AWS_BUCKET = 'dev.sosub.org'
 AWS_HOST = 'https://s3-ap-southeast-1.amazonaws.com'
+AWS_REGION = 'ap-southeast-1'
+# Another S3 compatible endpoint, e.g. a local one in development
+AWS_ENDPOINT_URL = env('AWS_ENDPOINT_URL', default='')
+# Uploads larger than a part go up in parts of this many bytes (at least 5 MB),
+# with this many parts in flight at once where boto3 transfers them
+AWS_MULTIPART_CHUNKSIZE = 8 * 1024 * 1024
+AWS_MAX_CONCURRENCY = 4
+# Largest file, in bytes, and seconds to start uploading it for direct uploads
+AWS_UPLOAD_MAX_SIZE = 100 * 1024 * 1024
+AWS_UPLOAD_EXPIRES = 10 * 60
+
+# Widths of the JPEG variants made of uploaded images by `manage.py
+# generate_image_variants`, their quality, and how many it makes at once
+IMAGE_SIZES = {
+    'small': 160,
+    'medium': 480,
+    'large': 1280,
+}
+IMAGE_QUALITY = 82
+IMAGE_WORKERS = 2
+# Failed tries after which an uploaded image is only retried with --all
+IMAGE_MAX_ATTEMPTS = 3
 
 YOUTUBE_API_KEY = env('YOUTUBE_API_KEY')
+YOUTUBE_API_URL = env('YOUTUBE_API_URL', default='https://www.googleapis.com/youtube/v3')
+# Seconds to wait for the YouTube API, seconds its answers stay cached, and
+# keep-alive connections kept open to it per process
+YOUTUBE_FETCH_TIMEOUT = 10
+YOUTUBE_CACHE_TIMEOUT = 6 * 60 * 60
+YOUTUBE_POOL_SIZE = 10
+# Quota units a day that refresh_youtube_metadata may bring the day's usage up to
+YOUTUBE_DAILY_QUOTA = 5000
+
+# How many of the matches of a search are ordered by relevance, the best ranked of
+# all of them; lists go on with the other matches in their own order
+SEARCH_RESULT_LIMIT = 1000
+
+# Views are written behind: at most this many seconds late, or as soon as this many
+# are waiting in a process. An interval of 0 writes every view immediately.
+VIEW_COUNT_FLUSH_INTERVAL = 10
+VIEW_COUNT_FLUSH_THRESHOLD = 100
+
+# Seconds an anonymous GraphQL response stays cached; mutations expire the ones
+# they affect earlier. 0 disables the cache.
+GRAPHQL_CACHE_TIMEOUT = 60
+
+# Parsed and validated GraphQL documents kept per process
+GRAPHQL_DOCUMENT_CACHE_SIZE = 500
+# Only run queries registered with `manage.py register_queries` (or sent once with
+# their hash when this is off) on the public endpoint
+GRAPHQL_REGISTERED_QUERIES_ONLY = env.bool('GRAPHQL_REGISTERED_QUERIES_ONLY', default=False)
+# Seconds the queries clients send with their hash are remembered when the above is off
+GRAPHQL_PERSISTED_QUERY_TIMEOUT = 24 * 60 * 60
+
+# Seconds to wait for a subtitle file when ingesting cues
+SUBTITLE_FETCH_TIMEOUT = 10
+# Seconds the aligned cues of a video stay cached, and the longest window in
+# milliseconds one request can read of them
+SUBTITLE_CACHE_TIMEOUT = 60 * 60
+SUBTITLE_WINDOW_MAX = 10 * 60 * 1000
+
+# Public address of the site, the paths of its pages for each kind of row, and
+# the other pages to list in the sitemap
+SITE_URL = env('SITE_URL', default='https://sosub.org')
+SITEMAP_PATHS = {
+    'videos': '/%s/',
+    'speakers': '/speaker/%s/',
+    'sources': '/source/%s/',
+    'categories': '/category/%s/',
+    'playlists': '/playlist/%s/',
+}
+SITEMAP_PAGES = ['/', '/s/']
+# Ids per sitemap file (the protocol allows at most 50,000 URLs in one), and
+# seconds a generated file stays cached
+SITEMAP_SHARD_SIZE = 50000
+SITEMAP_CACHE_TIMEOUT = 60 * 60
+
+# Videos written per transaction by the ImportVideos mutation
+IMPORT_CHUNK_SIZE = 200
+# Videos read at a time by the catalog export
+EXPORT_CHUNK_SIZE = 1000
 
 try:
     from dockerdeployer import *
@@ -1,17 +1,11 @@
-import uuid
 import os
-import requests
 
-import boto3
-from boto3.s3.transfer import TransferConfig
-
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.decorators import api_view, authentication_classes
 
-from . import models
-from .utils import youtube_duration_to_second, get_permission
-from ss_core.settings import AWS_ACCESS_KEY, AWS_SECRET_KEY, AWS_BUCKET, AWS_HOST, YOUTUBE_API_KEY
+from . import models, exporter, images, storage, subtitles, youtube
+from .utils import get_permission
 
 
 @api_view(['GET'])
@@ -33,30 +27,32 @@ def get_user(request):
 @authentication_classes((TokenAuthentication,))
 def upload_file(request):
     if get_permission('upload_file', request.user):
+        # The file streams to S3 as the body is read. Its folder is only known by
+        # then when `path` is in the query string; otherwise it is moved after.
+        # Subtitles are small and kept here to be validated before they are stored.
+        handler = storage.S3UploadHandler(request, 'upload_file', request.GET.get('path', ''), request.user.username,
+            local_extensions=('.srt',))
+        request.upload_handlers.insert(0, handler)
         try:
-            client = boto3.client(
-                "s3",
-                aws_access_key_id=AWS_ACCESS_KEY,
-                aws_secret_access_key=AWS_SECRET_KEY,
-            )
-
-            folder_path = request.POST.get('path', '')
+            folder_path = request.POST.get('path', request.GET.get('path', ''))
             upload_file = request.FILES['upload_file']
-            file_unique_name = os.path.join(folder_path, "%s.%s" % (str(uuid.uuid4()), str(upload_file).split(".")[-1]))
-
-            client.upload_fileobj(
-                upload_file,
-                AWS_BUCKET,
-                file_unique_name,
-                ExtraArgs={
-                    'ACL':'public-read',
-                    "Metadata": {
-                        "uploader": request.user.username
-                    },
-                    'ContentType': 'text/plain' if str(upload_file).split(".")[-1] == 'srt' else 'image/jpeg',
-                },
-            )
+            if not isinstance(upload_file, storage.S3File):
+                file_unique_name = storage.unique_key(folder_path, upload_file.name)
+                errors = subtitles.upload_srt(upload_file, file_unique_name, request.user.username)
+                if errors:
+                    raise Exception(subtitles.format_errors(errors))
+                return JsonResponse({
+                    "is_success": True,
+                    "detail": storage.public_url(file_unique_name),
+                })
+
+            file_unique_name = upload_file.key
+            if folder_path != handler.folder:
+                file_unique_name = os.path.join(folder_path, os.path.basename(upload_file.key))
+                storage.move(upload_file.key, file_unique_name)
+            images.enqueue(file_unique_name)
         except Exception as e:
+            handler.abort()
             return JsonResponse({
                 "is_success": False,
                 "detail": str(e),
@@ -64,7 +60,7 @@ def upload_file(request):
 
         return JsonResponse({
             "is_success": True,
-            "detail": os.path.join(AWS_HOST, AWS_BUCKET, file_unique_name)
+            "detail": storage.public_url(file_unique_name)
         })
     else:
         return JsonResponse({
@@ -73,11 +69,86 @@ def upload_file(request):
         })
 
 
+# Direct uploads: the client asks for a presigned POST, sends the file to S3 with
+# it, then confirms the upload to get its URL. No file bytes go through here.
+@api_view(['POST'])
+@authentication_classes((TokenAuthentication,))
+def presign_upload(request):
+    if not get_permission('upload_file', request.user):
+        return JsonResponse({
+            "is_success": False,
+            "detail": "Permission denied."
+        })
+
+    if not request.data.get('file_name'):
+        return JsonResponse({
+            "is_success": False,
+            "detail": "file_name is required."
+        })
+
+    try:
+        key, post, token = storage.presign_upload(request.data.get('path', ''), request.data['file_name'], request.user.username)
+    except Exception as e:
+        return JsonResponse({
+            "is_success": False,
+            "detail": str(e),
+        })
+
+    return JsonResponse({
+        "is_success": True,
+        "url": post['url'],
+        "fields": post['fields'],
+        "token": token,
+    })
+
+
+@api_view(['POST'])
+@authentication_classes((TokenAuthentication,))
+def confirm_upload(request):
+    if not get_permission('upload_file', request.user):
+        return JsonResponse({
+            "is_success": False,
+            "detail": "Permission denied."
+        })
+
+    try:
+        key = storage.confirm_upload(request.data.get('token', ''), request.user.username)
+        if key.lower().endswith('.srt'):
+            errors = subtitles.check_uploaded_srt(key)
+            if errors:
+                raise Exception(subtitles.format_errors(errors))
+        images.enqueue(key)
+    except Exception as e:
+        return JsonResponse({
+            "is_success": False,
+            "detail": str(e),
+        })
+
+    return JsonResponse({
+        "is_success": True,
+        "detail": storage.public_url(key)
+    })
+
+
+@api_view(['GET'])
+@authentication_classes((TokenAuthentication,))
+def export_catalog(request):
+    if not get_permission('export', request.user):
+        return JsonResponse({
+            "detail": "Permission denied."
+        }, status=403)
+
+    response = StreamingHttpResponse(exporter.export_catalog(), content_type='application/x-ndjson; charset=utf-8')
+    response['Content-Disposition'] = 'attachment; filename="catalog.jsonl"'
+    return response
+
+
 def youtube_duration(request):
     try:
-        response = requests.get('https://www.googleapis.com/youtube/v3/videos?part=contentDetails&id=%s&key=%s'
-                    % (request.GET['youtube_id'], YOUTUBE_API_KEY))
-        duration = youtube_duration_to_second(response.json()['items'][0]['contentDetails']['duration'])
+        videos = youtube.get_videos([request.GET['youtube_id']])
+        if not videos:
+            raise Exception("Video not found.")
+        duration = youtube.get_duration(list(videos.values())[0])
     except Exception as e:
         return JsonResponse({
             "detail": str(e) 
@@ -86,3 +157,39 @@ def youtube_duration(request):
     return JsonResponse({
         "duration": duration
     })
+
+
+@api_view(['GET'])
+@authentication_classes((TokenAuthentication,))
+def youtube_videos(request):
+    # For people adding videos only: every BATCH_SIZE ids not in the cache cost a
+    # unit of the daily API quota.
+    if not get_permission('create_video', request.user):
+        return JsonResponse({
+            "detail": "Permission denied."
+        }, status=403)
+
+    ids = [video_id for value in request.GET.getlist('ids') for video_id in value.split(',')]
+    if len(ids) > youtube.BATCH_SIZE:
+        return JsonResponse({
+            "detail": "At most %d ids are allowed." % youtube.BATCH_SIZE
+        }, status=400)
+
+    try:
+        videos = youtube.get_videos(ids)
+    except Exception as e:
+        return JsonResponse({
+            "detail": str(e)
+        })
+
+    return JsonResponse({
+        "videos": {
+            video_id: {
+                "title": item['snippet']['title'],
+                "description": item['snippet']['description'],
+                "image": youtube.get_thumbnail(item),
+                "duration": youtube.get_duration(item),
+            }
+            for video_id, item in videos.items()
+        }
+    })
@@ -0,0 +1,54 @@
+import time
+import tracemalloc
+
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from . import models
+
+# About the size of a talk transcript
+TRANSCRIPT = 'Lorem ipsum dolor sit amet, tiếng Việt có dấu. ' * 90
+
+
+def best_of(fn, repeat=5):
+    # Seconds of the fastest of `repeat` calls
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def with_peak(fn):
+    # (seconds, peak bytes allocated) of one call
+    tracemalloc.start()
+    try:
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return elapsed, peak
+
+
+def create_videos(count, **fields):
+    # `count` published videos with transcripts and spread dates, views and
+    # durations. Meant to run in a transaction the benchmark rolls back.
+    user = User.objects.create(username='benchmark-%d' % time.time())
+    now = timezone.now()
+    batch = []
+    for idx in range(count):
+        values = dict(
+            slug='benchmark-%d' % idx, title='Benchmark video %d' % idx, description=TRANSCRIPT[:1000],
+            image='image', video_id='video%d' % idx, duration=idx * 7919 % 5000, vi_sub='', en_sub='',
+            vi_transcript=TRANSCRIPT, en_transcript=TRANSCRIPT, view_amount=idx * 104729 % 100000,
+            created_by=user, is_published=True, published_at=now - timezone.timedelta(minutes=idx * 7907 % 5000000))
+        values.update(fields)
+        batch.append(models.Video(**values))
+        if len(batch) == 500:
+            models.Video.objects.bulk_create(batch)
+            batch = []
+    models.Video.objects.bulk_create(batch)
@@ -0,0 +1,75 @@
+from collections import namedtuple
+
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from . import models
+
+# `model.field` stores how many published videos reach `model.key` through `through.target`.
+Counter = namedtuple('Counter', 'model field key through target video')
+
+COUNTERS = (
+    Counter(models.Source, 'video_amount', 'pk', models.Video, 'source', ''),
+    Counter(models.Speaker, 'video_amount', 'pk', models.VideoSpeaker, 'speaker', 'video__'),
+    Counter(models.Category, 'video_amount', 'pk', models.VideoCategory, 'category', 'video__'),
+    Counter(models.Playlist, 'video_amount', 'pk', models.PlaylistVideo, 'playlist', 'video__'),
+    Counter(models.Profile, 'sponsored_video_amount', 'user', models.Video, 'sponsor', ''),
+    Counter(models.Profile, 'created_video_amount', 'user', models.Video, 'created_by', ''),
+)
+
+
+def published_video_amount(counter):
+    published = counter.through.objects\
+        .filter(**{counter.target: OuterRef(counter.key), counter.video + 'is_published': True})\
+        .order_by()\
+        .values(counter.target)\
+        .annotate(amount=Count('pk'))\
+        .values('amount')
+
+    return Coalesce(Subquery(published), 0)
+
+
+def keys_for(model, keys):
+    return {counter: set(keys) for counter in COUNTERS if counter.model is model}
+
+
+def refresh_video_amounts(keys=None):
+    # Recomputes every counter, or only the rows in `keys` ({counter: set of keys}).
+    for counter in COUNTERS:
+        queryset = counter.model.objects.all()
+        if keys is not None:
+            if not keys.get(counter):
+                continue
+            queryset = queryset.filter(**{counter.key + '__in': keys[counter]})
+
+        queryset.update(**{counter.field: published_video_amount(counter)})
+
+
+class VideoAmountTracker:
+    # Remembers which counters the given published videos contribute to, so that
+    # the ones they stop contributing to after an update are refreshed as well.
+    # Use inside the transaction that changes the videos.
+    def __init__(self, video_ids=()):
+        self.video_ids = set()
+        self.keys = {counter: set() for counter in COUNTERS}
+        self.track(video_ids)
+
+    def track(self, video_ids):
+        video_ids = set(video_ids)
+        self.video_ids |= video_ids
+
+        published_ids = list(models.Video.objects.filter(pk__in=video_ids, is_published=True).values_list('pk', flat=True))
+        if not published_ids:
+            return
+
+        for counter in COUNTERS:
+            self.keys[counter].update(
+                key for key in counter.through.objects
+                    .filter(**{counter.video + 'pk__in': published_ids})
+                    .values_list(counter.target, flat=True)
+                if key is not None
+            )
+
+    def refresh(self, video_ids=()):
+        self.track(self.video_ids | set(video_ids))
+        refresh_video_amounts(self.keys)
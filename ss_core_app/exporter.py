@@ -0,0 +1,130 @@
+import json
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from . import models
+
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def timestamp(value):
+    # In UTC, the format importer.parse_timestamp reads.
+    return timezone.localtime(value, timezone.utc).isoformat() if value else None
+
+
+def related_slugs(through, field, video_ids):
+    slugs = {}
+    for video_id, slug in through.objects.filter(video__in=video_ids).order_by('pk').values_list('video', field):
+        slugs.setdefault(video_id, []).append(slug)
+    return slugs
+
+
+def export_users(chunk_size):
+    users = User.objects\
+        .filter(profile__isnull=False)\
+        .order_by('pk')\
+        .values('username', 'first_name', 'email', 'profile__role', 'profile__quote', 'profile__bio',
+            'profile__avatar', 'profile__cover', 'profile__facebook', 'profile__website')
+
+    for user in users.iterator(chunk_size=chunk_size):
+        yield {
+            "type": "user",
+            "username": user['username'],
+            "name": user['first_name'],
+            "email": user['email'],
+            "role": user['profile__role'],
+            "quote": user['profile__quote'],
+            "bio": user['profile__bio'],
+            "avatar": user['profile__avatar'],
+            "cover": user['profile__cover'],
+            "facebook": user['profile__facebook'],
+            "website": user['profile__website'],
+        }
+
+
+def export_videos(chunk_size):
+    videos = models.Video.objects\
+        .order_by('pk')\
+        .values('pk', 'slug', 'title', 'description', 'image', 'video_id', 'duration', 'vi_sub', 'en_sub',
+            'vi_transcript', 'en_transcript', 'view_amount', 'is_published', 'created_at', 'created_by__username',
+            'published_at', 'published_by__username', 'source__slug', 'sponsor__username')
+
+    # iterator() cannot prefetch, so relations are read for each chunk of videos.
+    for chunk in chunks(videos.iterator(chunk_size=chunk_size), chunk_size):
+        video_ids = [video['pk'] for video in chunk]
+        speakers = related_slugs(models.VideoSpeaker, 'speaker__slug', video_ids)
+        categories = related_slugs(models.VideoCategory, 'category__slug', video_ids)
+        subcategories = related_slugs(models.VideoSubCategory, 'subcategory__slug', video_ids)
+        tags = related_slugs(models.Tag, 'slug', video_ids)
+
+        for video in chunk:
+            yield {
+                "type": "video",
+                "slug": video['slug'],
+                "title": video['title'],
+                "description": video['description'],
+                "image": video['image'],
+                "video_id": video['video_id'],
+                "duration": video['duration'],
+                "vi_sub": video['vi_sub'],
+                "en_sub": video['en_sub'],
+                "vi_transcript": video['vi_transcript'],
+                "en_transcript": video['en_transcript'],
+                "view_amount": video['view_amount'],
+                "is_published": video['is_published'],
+                "created_at": timestamp(video['created_at']),
+                "created_by": video['created_by__username'],
+                "published_at": timestamp(video['published_at']),
+                "published_by": video['published_by__username'],
+                "source": video['source__slug'] or "",
+                "sponsor": video['sponsor__username'] or "",
+                "speakers": speakers.get(video['pk'], []),
+                "categories": categories.get(video['pk'], []),
+                "subcategories": subcategories.get(video['pk'], []),
+                "tags": tags.get(video['pk'], []),
+            }
+
+
+def export_playlists(chunk_size):
+    playlists = models.Playlist.objects\
+        .order_by('pk')\
+        .values('pk', 'slug', 'name', 'description', 'image')
+
+    for chunk in chunks(playlists.iterator(chunk_size=chunk_size), chunk_size):
+        videos = {}
+        playlist_videos = models.PlaylistVideo.objects\
+            .filter(playlist__in=[playlist['pk'] for playlist in chunk])\
+            .order_by('priority', 'pk')\
+            .values_list('playlist', 'video__slug')
+        for playlist_id, slug in playlist_videos:
+            videos.setdefault(playlist_id, []).append(slug)
+
+        for playlist in chunk:
+            yield {
+                "type": "playlist",
+                "slug": playlist['slug'],
+                "name": playlist['name'],
+                "description": playlist['description'],
+                "image": playlist['image'],
+                "videos": videos.get(playlist['pk'], []),
+            }
+
+
+def export_catalog(chunk_size=None):
+    # Lines of JSON that `manage.py import_catalog` reads back: users, then the
+    # videos that refer to them, then the playlists of those videos. Sources,
+    # speakers and categories are not part of it.
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    for records in (export_users(chunk_size), export_videos(chunk_size), export_playlists(chunk_size)):
+        for record in records:
+            yield json.dumps(record, ensure_ascii=False) + '\n'
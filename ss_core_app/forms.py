@@ -47,6 +47,31 @@ class VideoImportForm(forms.ModelForm):
         )
 
 
+class VideoBatchImportForm(forms.ModelForm):
+    # References and slug uniqueness are checked for the whole batch by the importer.
+    class Meta:
+        model = models.Video
+        fields = (
+            'slug',
+            'title',
+            'description',
+            'image',
+            'video_id',
+            'duration',
+            'vi_sub',
+            'en_sub',
+            'vi_transcript',
+            'en_transcript',
+            'view_amount',
+            'is_published',
+            'created_at',
+            'published_at',
+        )
+
+    def validate_unique(self):
+        pass
+
+
 class VideoSpeakerForm(forms.ModelForm):
     class Meta:
         model = models.VideoSpeaker
@@ -0,0 +1,155 @@
+import hashlib
+import json
+import uuid
+
+from graphene_django.views import GraphQLView
+from graphql.language import ast
+from graphql.language.printer import print_ast
+from graphql.type.definition import GraphQLObjectType, get_named_type
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+KEY_PREFIX = 'graphql:response:'
+TAG_PREFIX = 'graphql:tag:'
+
+
+def tag_for(model):
+    return model._meta.label_lower
+
+
+def invalidate(*models):
+    # Expires every cached response that selected one of `models`, once the
+    # current transaction commits so that no reader caches the old rows meanwhile.
+    keys = [TAG_PREFIX + tag_for(model) for model in models]
+    transaction.on_commit(lambda: cache.set_many({key: uuid.uuid4().hex for key in keys}, None))
+
+
+def get_operation(document, operation_name):
+    operations = [
+        definition for definition in document.definitions
+        if isinstance(definition, ast.OperationDefinition)
+    ]
+    if operation_name:
+        operations = [operation for operation in operations if operation.name and operation.name.value == operation_name]
+    return operations[0] if len(operations) == 1 else None
+
+
+def collect_tags(schema, gql_type, selection_set, fragments, tags):
+    # Adds the models behind the object types selected under `selection_set`.
+    # Returns False when a selection reaches an interface or union, whose models
+    # are only known at execution.
+    for selection in selection_set.selections:
+        if isinstance(selection, ast.Field):
+            name = selection.name.value
+            if name.startswith('__'):
+                continue
+            field = gql_type.fields.get(name)
+            if field is None:
+                return False
+            field_type = get_named_type(field.type)
+            if selection.selection_set is None:
+                continue
+            if not isinstance(field_type, GraphQLObjectType):
+                return False
+            # Plain object types can name the model they are read from.
+            model = getattr(getattr(field_type.graphene_type, '_meta', None), 'model', None) or \
+                getattr(field_type.graphene_type, 'model', None)
+            if model is not None:
+                tags.add(tag_for(model))
+            if not collect_tags(schema, field_type, selection.selection_set, fragments, tags):
+                return False
+        else:
+            if isinstance(selection, ast.FragmentSpread):
+                fragment = fragments.get(selection.name.value)
+                if fragment is None:
+                    return False
+            else:
+                fragment = selection
+            target = schema.get_type(fragment.type_condition.name.value) if fragment.type_condition else gql_type
+            if target is not gql_type:
+                return False
+            if not collect_tags(schema, gql_type, fragment.selection_set, fragments, tags):
+                return False
+    return True
+
+
+def plan(schema, document_ast, operation_name):
+    # (digest of the normalized document, tags) of a query operation, or None when
+    # it cannot be cached.
+    operation = get_operation(document_ast, operation_name)
+    if operation is None or operation.operation != 'query':
+        return None
+
+    fragments = {
+        definition.name.value: definition for definition in document_ast.definitions
+        if isinstance(definition, ast.FragmentDefinition)
+    }
+    tags = set()
+    if not collect_tags(schema, schema.get_query_type(), operation.selection_set, fragments, tags):
+        return None
+
+    # print_ast drops comments and normalizes whitespace.
+    return hashlib.sha1(print_ast(document_ast).encode('utf-8')).hexdigest(), sorted(tags)
+
+
+def prepare(schema, document, variables, operation_name):
+    # (cache key, tags) of a request. Plans are kept on the document, which the
+    # backend may reuse across requests.
+    if not hasattr(document, 'cache_plans'):
+        document.cache_plans = {}
+    plans = document.cache_plans
+    if operation_name not in plans:
+        plans[operation_name] = plan(schema, document.document_ast, operation_name)
+    if plans[operation_name] is None:
+        return None
+
+    digest, tags = plans[operation_name]
+    key = hashlib.sha1(json.dumps([digest, variables or {}, operation_name or ''], sort_keys=True).encode('utf-8'))
+    return KEY_PREFIX + key.hexdigest(), tags
+
+
+def get_tag_versions(tags):
+    keys = [TAG_PREFIX + tag for tag in tags]
+    versions = cache.get_many(keys)
+    # A tag whose version was evicted starts a new one, which no entry matches.
+    missing = {key: uuid.uuid4().hex for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return versions
+
+
+class CachedGraphQLView(GraphQLView):
+    # Serves repeated anonymous queries from Django's cache. An entry remembers the
+    # version of every model tag it selected, and is a miss once any of them has
+    # been bumped by invalidate(), or after GRAPHQL_CACHE_TIMEOUT seconds.
+    def execute_graphql_request(self, *args, **kwargs):
+        execution_result = super(CachedGraphQLView, self).execute_graphql_request(*args, **kwargs)
+        self.cacheable = execution_result is not None and not execution_result.errors
+        return execution_result
+
+    def get_response(self, request, data, show_graphiql=False):
+        if show_graphiql or request.user.is_authenticated or not settings.GRAPHQL_CACHE_TIMEOUT:
+            return super(CachedGraphQLView, self).get_response(request, data, show_graphiql)
+
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+        try:
+            document = self.get_backend(request).document_from_string(self.schema, query) if query else None
+        except Exception:
+            document = None
+        prepared = prepare(self.schema, document, variables, operation_name) if document else None
+        if prepared is None:
+            return super(CachedGraphQLView, self).get_response(request, data, show_graphiql)
+
+        key, tags = prepared
+        entry = cache.get(key)
+        versions = get_tag_versions(tags)
+        if entry is not None and entry['versions'] == versions:
+            return entry['result'], 200
+
+        result, status_code = super(CachedGraphQLView, self).get_response(request, data, show_graphiql)
+        if status_code == 200 and self.cacheable:
+            cache.set(key, {'versions': versions, 'result': result}, settings.GRAPHQL_CACHE_TIMEOUT)
+        return result, status_code
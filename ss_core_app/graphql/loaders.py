@@ -0,0 +1,97 @@
+from collections import defaultdict
+
+from promise import Promise
+from promise.dataloader import DataLoader
+
+from django.db.models import F
+
+from .. import models
+from ..images import get_sizes
+from ..subtitles import get_cue_pairs
+
+
+# Keeps the `IN (...)` list under SQLite's bound-parameter limit on nested pages.
+MAX_BATCH_SIZE = 500
+
+
+class RelatedLoader(DataLoader):
+    # Loads the `model` rows linked to a batch of videos through `through`,
+    # one `IN (...)` query per batch instead of one query per video.
+    max_batch_size = MAX_BATCH_SIZE
+    model = None
+    through = None
+
+    def batch_load_fn(self, video_ids):
+        related = defaultdict(list)
+        queryset = self.model.objects\
+            .filter(**{"%s__video__in" % self.through: video_ids})\
+            .annotate(_video_id=F("%s__video" % self.through))\
+            .order_by("%s__id" % self.through)
+
+        for obj in queryset:
+            related[obj._video_id].append(obj)
+
+        return Promise.resolve([related.get(video_id, []) for video_id in video_ids])
+
+
+class SpeakersByVideoLoader(RelatedLoader):
+    model = models.Speaker
+    through = 'videospeaker'
+
+
+class CategoriesByVideoLoader(RelatedLoader):
+    model = models.Category
+    through = 'videocategory'
+
+
+class SubCategoriesByVideoLoader(RelatedLoader):
+    model = models.SubCategory
+    through = 'videosubcategory'
+
+
+class TagsByVideoLoader(DataLoader):
+    max_batch_size = MAX_BATCH_SIZE
+
+    def batch_load_fn(self, video_ids):
+        tags = defaultdict(list)
+        for tag in models.Tag.objects.filter(video__in=video_ids).order_by('id'):
+            tags[tag.video_id].append(tag)
+
+        return Promise.resolve([tags.get(video_id, []) for video_id in video_ids])
+
+
+class ImageSizesLoader(DataLoader):
+    # The sizes of the variants recorded for a batch of image keys.
+    max_batch_size = MAX_BATCH_SIZE
+
+    def batch_load_fn(self, keys):
+        sizes = get_sizes(keys)
+        return Promise.resolve([sizes[key] for key in keys])
+
+
+class CuePairsLoader(DataLoader):
+    # The aligned cues of a batch of videos, from the cache or one query.
+    max_batch_size = MAX_BATCH_SIZE
+
+    def batch_load_fn(self, video_ids):
+        return Promise.resolve(get_cue_pairs(video_ids))
+
+
+class Loaders:
+    def __init__(self):
+        self.speakers_by_video = SpeakersByVideoLoader()
+        self.categories_by_video = CategoriesByVideoLoader()
+        self.subcategories_by_video = SubCategoriesByVideoLoader()
+        self.tags_by_video = TagsByVideoLoader()
+        self.image_sizes = ImageSizesLoader()
+        self.cue_pairs = CuePairsLoader()
+
+
+def get_loaders(info):
+    # Loaders live on the request so their caches never outlive it.
+    context = info.context
+    loaders = getattr(context, '_loaders', None)
+    if loaders is None:
+        loaders = Loaders()
+        context._loaders = loaders
+    return loaders
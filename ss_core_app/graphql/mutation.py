@@ -1,14 +1,20 @@
 import graphene
-from datetime import datetime
 from django.db import transaction
 from django.utils import timezone
 from django.contrib.auth.models import User
 from django.contrib.admin.models import LogEntry, ADDITION, CHANGE
 from django.contrib.contenttypes.models import ContentType
 
-from .. import models, forms
-from ..utils import name_to_slug, get_permission
+from .. import models, forms, sitemap
+from ..utils import get_permission
+from ..counters import VideoAmountTracker
+from ..importer import import_videos, import_user, import_playlist
+from ..relations import set_video_relations
+from ..search import index_videos, index_speakers, index_sources
+from ..subtitles import clear_cues
+from ..view_counter import view_counter
 from . import query
+from .cache import invalidate
 
 class CreateVideo(graphene.Mutation):
     class Arguments:
@@ -62,41 +68,9 @@ class CreateVideo(graphene.Mutation):
             video.created_at = timezone.now()
             video.save()
 
-            for speaker_id in speaker_ids:
-                video_speaker_form = forms.VideoSpeakerForm({
-                    "video": video.id,
-                    "speaker": speaker_id
-                })
-                if not video_speaker_form.is_valid():
-                    raise Exception(video_speaker_form.errors.as_json())
-                video_speaker_form.save()
-
-            for category_id in category_ids:
-                video_category_form = forms.VideoCategoryForm({
-                    "video": video.id,
-                    "category": category_id
-                })
-                if not video_category_form.is_valid():
-                    raise Exception(video_category_form.errors.as_json())
-                video_category_form.save()
-
-            for subcategory_id in subcategory_ids:
-                video_subcategory_form = forms.VideoSubCategoryForm({
-                    "video": video.id,
-                    "subcategory": subcategory_id
-                })
-                if not video_subcategory_form.is_valid():
-                    raise Exception(video_subcategory_form.errors.as_json())
-                video_subcategory_form.save()
-
-            for tag in tags:
-                tag_form = forms.TagForm({
-                    "video": video.id,
-                    "slug": name_to_slug(tag)
-                })
-                if not tag_form.is_valid():
-                    raise Exception(tag_form.errors.as_json())
-                tag_form.save()
+            set_video_relations(video, speaker_ids, category_ids, subcategory_ids, tags)
+
+            index_videos([video.id])
 
             LogEntry.objects.log_action(
                 user_id=user.id,
@@ -105,6 +79,8 @@ class CreateVideo(graphene.Mutation):
                 object_repr=video.title,
                 action_flag=ADDITION)
 
+            invalidate(models.Video, models.Tag)
+
             return CreateVideo(video=video)
 
 
@@ -138,6 +114,9 @@ class UpdateVideo(graphene.Mutation):
             raise Exception("Permission denied.")
 
         with transaction.atomic():
+            video_amounts = VideoAmountTracker([id])
+            old_subs = models.Video.objects.filter(pk=id).values_list('vi_sub', 'en_sub').get()
+
             video_form = forms.VideoForm(
                 {
                     "slug": slug,
@@ -164,45 +143,14 @@ class UpdateVideo(graphene.Mutation):
             video.updated_at = timezone.now()
             video.save()
 
-            models.VideoSpeaker.objects.filter(video=video).delete()
-            for speaker_id in speaker_ids:
-                video_speaker_form = forms.VideoSpeakerForm({
-                    "video": video.id,
-                    "speaker": speaker_id
-                })
-                if not video_speaker_form.is_valid():
-                    raise Exception(video_speaker_form.errors.as_json())
-                video_speaker_form.save()
-
-            models.VideoCategory.objects.filter(video=video).delete()
-            for category_id in category_ids:
-                video_category_form = forms.VideoCategoryForm({
-                    "video": video.id,
-                    "category": category_id
-                })
-                if not video_category_form.is_valid():
-                    raise Exception(video_category_form.errors.as_json())
-                video_category_form.save()
-
-            models.VideoSubCategory.objects.filter(video=video).delete()
-            for subcategory_id in subcategory_ids:
-                video_subcategory_form = forms.VideoSubCategoryForm({
-                    "video": video.id,
-                    "subcategory": subcategory_id
-                })
-                if not video_subcategory_form.is_valid():
-                    raise Exception(video_subcategory_form.errors.as_json())
-                video_subcategory_form.save()
-
-            models.Tag.objects.filter(video=video).delete()
-            for tag in tags:
-                tag_form = forms.TagForm({
-                    "video": video.id,
-                    "slug": name_to_slug(tag)
-                })
-                if not tag_form.is_valid():
-                    raise Exception(tag_form.errors.as_json())
-                tag_form.save()
+            # Cues of replaced subtitle files are stale; ingest_subtitles --missing picks the video up
+            # again, and cuePairs is empty meanwhile.
+            if (video.vi_sub, video.en_sub) != old_subs:
+                clear_cues([video.id])
+
+            set_video_relations(video, speaker_ids, category_ids, subcategory_ids, tags)
+
+            index_videos([video.id])
 
             LogEntry.objects.log_action(
                 user_id=user.id,
@@ -211,6 +159,11 @@ class UpdateVideo(graphene.Mutation):
                 object_repr=video.title,
                 action_flag=CHANGE)
 
+            video_amounts.refresh()
+
+            invalidate(models.Video, models.Tag, models.Cue, models.Source, models.Speaker, models.Category, models.Playlist, User)
+            sitemap.invalidate([video.id])
+
             return UpdateVideo(video=video)
 
 
@@ -240,6 +193,7 @@ class CreateSource(graphene.Mutation):
             raise Exception(source_form.errors.as_json())
         
         source = source_form.save()
+        index_sources([source.id])
 
         LogEntry.objects.log_action(
             user_id=user.id,
@@ -248,6 +202,8 @@ class CreateSource(graphene.Mutation):
             object_repr=source.name,
             action_flag=ADDITION)
 
+        invalidate(models.Source, models.Video)
+
         return CreateSource(source=source)
 
 
@@ -278,6 +234,7 @@ class UpdateSource(graphene.Mutation):
             raise Exception(source_form.errors.as_json())
         
         source = source_form.save()
+        index_sources([source.id])
 
         LogEntry.objects.log_action(
             user_id=user.id,
@@ -286,6 +243,8 @@ class UpdateSource(graphene.Mutation):
             object_repr=source.name,
             action_flag=CHANGE)
 
+        invalidate(models.Source, models.Video)
+
         return UpdateSource(source=source)
 
 
@@ -315,6 +274,7 @@ class CreateSpeaker(graphene.Mutation):
             raise Exception(speaker_form.errors.as_json())
         
         speaker = speaker_form.save()
+        index_speakers([speaker.id])
 
         LogEntry.objects.log_action(
             user_id=user.id,
@@ -323,6 +283,8 @@ class CreateSpeaker(graphene.Mutation):
             object_repr=speaker.name,
             action_flag=ADDITION)
 
+        invalidate(models.Speaker, models.Video)
+
         return CreateSpeaker(speaker=speaker)
 
 
@@ -353,6 +315,7 @@ class UpdateSpeaker(graphene.Mutation):
             raise Exception(speaker_form.errors.as_json())
         
         speaker = speaker_form.save()
+        index_speakers([speaker.id])
 
         LogEntry.objects.log_action(
             user_id=user.id,
@@ -361,6 +324,8 @@ class UpdateSpeaker(graphene.Mutation):
             object_repr=speaker.name,
             action_flag=CHANGE)
 
+        invalidate(models.Speaker, models.Video)
+
         return UpdateSpeaker(speaker=speaker)
 
 
@@ -393,6 +358,8 @@ class CreateCategory(graphene.Mutation):
         
         category = category_form.save()
 
+        invalidate(models.Category)
+
         return CreateCategory(category=category)
 
 
@@ -427,6 +394,8 @@ class CreateSubCategory(graphene.Mutation):
         
         subcategory = subcategory_form.save()
 
+        invalidate(models.SubCategory, models.Category)
+
         return CreateSubCategory(subcategory=subcategory)
 
 
@@ -438,8 +407,7 @@ class IncreaseViews(graphene.Mutation):
 
     def mutate(self, info, slug):
         video = models.Video.objects.get(is_published=True, slug=slug)
-        video.view_amount += 1
-        video.save()
+        video.view_amount += view_counter.add(video.id)
 
         return IncreaseViews(video=video)
 
@@ -456,21 +424,27 @@ class PublishVideo(graphene.Mutation):
         if not get_permission('publish_video', user):
             raise Exception("Permission denied.")
 
-        video = models.Video.objects.get(pk=id)
-        video.is_published = True
-        video.published_by = user
-        video.published_at = timezone.now()
-        video.save()
+        with transaction.atomic():
+            video = models.Video.objects.get(pk=id)
+            video.is_published = True
+            video.published_by = user
+            video.published_at = timezone.now()
+            video.save()
+
+            VideoAmountTracker([video.id]).refresh()
 
-        LogEntry.objects.log_action(
-            user_id=user.id,
-            content_type_id=ContentType.objects.get_for_model(video).pk,
-            object_id=video.id,
-            object_repr=video.title,
-            action_flag=CHANGE,
-            change_message="""[{"changed": {"fields": ["is_published", "published_by", "published_at"]}}]""")
+            LogEntry.objects.log_action(
+                user_id=user.id,
+                content_type_id=ContentType.objects.get_for_model(video).pk,
+                object_id=video.id,
+                object_repr=video.title,
+                action_flag=CHANGE,
+                change_message="""[{"changed": {"fields": ["is_published", "published_by", "published_at"]}}]""")
 
-        return PublishVideo(video=video)
+            invalidate(models.Video, models.Source, models.Speaker, models.Category, models.Playlist, User)
+            sitemap.invalidate([video.id])
+
+            return PublishVideo(video=video)
 
 
 class ImportVideo(graphene.Mutation):
@@ -500,90 +474,76 @@ class ImportVideo(graphene.Mutation):
 
     video = graphene.Field(query.Video, slug=graphene.String())
 
-    def mutate(self, info, slug, title, description, image, video_id, duration, 
-        vi_sub, en_sub, vi_transcript, en_transcript, view_amount, is_published, 
-        created_at, created_by, published_at, published_by,
-        source, sponsor, speakers, categories, subcategories, tags):
+    def mutate(self, info, **arguments):
 
         user = info.context.user
 
         if not get_permission('import', user):
             raise Exception("Permission denied.")
 
-        with transaction.atomic():
-            try:
-                models.Video.objects.get(slug=slug).delete()
-            except:
-                pass
+        # Updates the video with the same slug in place, see importer.write_videos.
+        [(video, errors)] = import_videos([arguments])
+        if errors:
+            raise Exception(errors)
+
+        invalidate(models.Video, models.Tag, models.Cue, models.Source, models.Speaker, models.Category, models.Playlist, User)
+
+        return ImportVideo(video=video)
+
+
+class VideoImportInput(graphene.InputObjectType):
+    slug = graphene.String()
+    title = graphene.String()
+    description = graphene.String()
+    image = graphene.String()
+    video_id = graphene.String()
+    duration = graphene.Int()
+    vi_sub = graphene.String()
+    en_sub = graphene.String()
+    vi_transcript = graphene.String(default_value="")
+    en_transcript = graphene.String(default_value="")
+    view_amount = graphene.Int()
+    is_published = graphene.Boolean()
+    created_at = graphene.String()
+    created_by = graphene.String()
+    published_at = graphene.String()
+    published_by = graphene.String()
+    source = graphene.String(default_value="")
+    sponsor = graphene.String(default_value="")
+    speakers = graphene.List(graphene.String, default_value=[])
+    categories = graphene.List(graphene.String, default_value=[])
+    subcategories = graphene.List(graphene.String, default_value=[])
+    tags = graphene.List(graphene.String, default_value=[])
+
+
+class VideoImportResult(graphene.ObjectType):
+    slug = graphene.String()
+    video = graphene.Field(query.Video)
+    # Same JSON as the errors of ImportVideo, null when the video was imported.
+    errors = graphene.String()
+
+
+class ImportVideos(graphene.Mutation):
+    class Arguments:
+        videos = graphene.List(VideoImportInput, required=True)
 
-            try:
-                creator = User.objects.get(username=created_by)
-            except User.DoesNotExist:
-                creator = User.objects.get(username="admin")
+    results = graphene.List(VideoImportResult)
 
-            video_form = forms.VideoImportForm({
-                "slug": slug,
-                "title": title,
-                "description": description,
-                "image": image,
-                "video_id": video_id,
-                "duration": duration,
-                "vi_sub": vi_sub,
-                "en_sub": en_sub,
-                "vi_transcript": vi_transcript,
-                "en_transcript": en_transcript,
-                "view_amount": view_amount,
-                "is_published": is_published,
-                "created_at": datetime.strptime(created_at[:19]+"+"+created_at[-5:-3]+created_at[-2:], '%Y-%m-%dT%H:%M:%S%z'),
-                "created_by": creator.id,
-                "published_at": datetime.strptime(published_at[:19]+"+"+published_at[-5:-3]+published_at[-2:], '%Y-%m-%dT%H:%M:%S%z'),
-                "published_by": User.objects.get(username=published_by).id,
-                "source": models.Source.objects.get(slug=source).id,
-                "sponsor": User.objects.get(username=sponsor).id if sponsor else None,
-            })
+    def mutate(self, info, videos):
 
-            if not video_form.is_valid():
-                raise Exception(video_form.errors.as_json())
-            
-            video = video_form.save()
-
-            for speaker in speakers:
-                video_speaker_form = forms.VideoSpeakerForm({
-                    "video": video.id,
-                    "speaker": models.Speaker.objects.get(slug=speaker).id,
-                })
-                if not video_speaker_form.is_valid():
-                    raise Exception(video_speaker_form.errors.as_json())
-                video_speaker_form.save()
-
-            for category in categories:
-                video_category_form = forms.VideoCategoryForm({
-                    "video": video.id,
-                    "category": models.Category.objects.get(slug=category).id,
-                })
-                if not video_category_form.is_valid():
-                    raise Exception(video_category_form.errors.as_json())
-                video_category_form.save()
-
-            for subcategory in subcategories:
-                video_subcategory_form = forms.VideoSubCategoryForm({
-                    "video": video.id,
-                    "subcategory": models.SubCategory.objects.get(slug=subcategory).id,
-                })
-                if not video_subcategory_form.is_valid():
-                    raise Exception(video_subcategory_form.errors.as_json())
-                video_subcategory_form.save()
-
-            for tag in tags:
-                tag_form = forms.TagForm({
-                    "video": video.id,
-                    "slug": tag,
-                })
-                if not tag_form.is_valid():
-                    raise Exception(tag_form.errors.as_json())
-                tag_form.save()
-
-            return ImportVideo(video=video)
+        user = info.context.user
+
+        if not get_permission('import', user):
+            raise Exception("Permission denied.")
+
+        results = import_videos(videos)
+
+        invalidate(models.Video, models.Tag, models.Cue, models.Source, models.Speaker, models.Category, models.Playlist, User)
+
+        return ImportVideos(results=[
+            VideoImportResult(slug=item.get('slug'), video=video, errors=errors)
+            for item, (video, errors) in zip(videos, results)
+        ])
 
 
 class ImportUser(graphene.Mutation):
@@ -601,7 +561,7 @@ class ImportUser(graphene.Mutation):
 
     user = graphene.Field(query.User, slug=graphene.String())
 
-    def mutate(self, info, username, name, email, role, quote, bio, avatar, cover, facebook, website):
+    def mutate(self, info, **arguments):
 
         user = info.context.user
 
@@ -609,32 +569,9 @@ class ImportUser(graphene.Mutation):
             raise Exception("Permission denied.")
 
         with transaction.atomic():
-            user_form = forms.UserForm({
-                "username": username,
-                "first_name": name,
-                "email": email,
-            })
-
-            if not user_form.is_valid():
-                raise Exception(user_form.errors.as_json())
-            
-            user = user_form.save()
-
-            profile_form = forms.ProfileForm({
-                "user": user.id,
-                "role": role,
-                "quote": quote,
-                "bio": bio,
-                "avatar": avatar,
-                "cover": cover,
-                "facebook": facebook,
-                "website": website,
-            })
-
-            if not profile_form.is_valid():
-                raise Exception(profile_form.errors.as_json())
+            user = import_user(arguments)
 
-            profile_form.save()
+            invalidate(User)
 
             return ImportUser(user=user)
 
@@ -649,7 +586,7 @@ class ImportPlaylist(graphene.Mutation):
 
     playlist = graphene.Field(query.Playlist, slug=graphene.String())
 
-    def mutate(self, info, slug, name, description, image, videos):
+    def mutate(self, info, **arguments):
 
         user = info.context.user
 
@@ -657,28 +594,10 @@ class ImportPlaylist(graphene.Mutation):
             raise Exception("Permission denied.")
 
         with transaction.atomic():
-            playlist_form = forms.PlaylistForm({
-                "slug": slug,
-                "name": name,
-                "description": description,
-                "image": image,
-            })
+            playlist = import_playlist(arguments)
+
+            invalidate(models.Playlist)
 
-            if not playlist_form.is_valid():
-                raise Exception(playlist_form.errors.as_json())
-            
-            playlist = playlist_form.save()
-
-            for idx, video in enumerate(videos):
-                playlist_video_form = forms.PlaylistVideoForm({
-                    "video": models.Video.objects.get(slug=video).id,
-                    "playlist": playlist.id,
-                    "priority": idx+1,
-                })
-                if not playlist_video_form.is_valid():
-                    raise Exception(playlist_video_form.errors.as_json())
-                playlist_video_form.save()
-            
             return ImportPlaylist(playlist=playlist)
 
 class Mutation(graphene.ObjectType):
@@ -698,5 +617,6 @@ class Mutation(graphene.ObjectType):
     publish_video = PublishVideo.Field()
 
     import_video = ImportVideo.Field()
+    import_videos = ImportVideos.Field()
     import_user = ImportUser.Field()
     import_playlist = ImportPlaylist.Field()
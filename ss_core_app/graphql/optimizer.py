@@ -0,0 +1,114 @@
+from collections import OrderedDict
+
+from graphql.language.ast import FragmentSpread, InlineFragment
+from graphene.utils.str_converters import to_snake_case
+from graphene_django.filter import DjangoFilterConnectionField
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Manager
+from django.db.models.query import QuerySet
+from django.contrib.auth import models as auth_models
+
+# GraphQL User fields that are read from the related Profile row.
+PROFILE_FIELDS = ('description', 'quote', 'avatar', 'image', 'cover', 'website', 'facebook')
+
+
+def collect_fields(info, selection_sets):
+    # Flattens fragments and merges repeated fields, keyed by snake_case name.
+    fields = OrderedDict()
+    for selection_set in selection_sets:
+        if selection_set is None:
+            continue
+        for selection in selection_set.selections:
+            if isinstance(selection, FragmentSpread):
+                fragment = info.fragments[selection.name.value]
+                nested = collect_fields(info, [fragment.selection_set])
+            elif isinstance(selection, InlineFragment):
+                nested = collect_fields(info, [selection.selection_set])
+            else:
+                nested = {to_snake_case(selection.name.value): [selection.selection_set]}
+
+            for name, sets in nested.items():
+                fields.setdefault(name, []).extend(sets)
+    return fields
+
+
+def get_node_fields(info):
+    # Selected fields of `node` when resolving a connection, or of the field itself otherwise.
+    fields = collect_fields(info, [field_ast.selection_set for field_ast in info.field_asts])
+    if 'edges' not in fields:
+        return fields
+
+    edges = collect_fields(info, fields['edges'])
+    return collect_fields(info, edges.get('node', []))
+
+
+def optimize_queryset(queryset, info):
+    if isinstance(queryset, Manager):
+        queryset = queryset.get_queryset()
+    if not isinstance(queryset, QuerySet):
+        return queryset
+
+    opts = queryset.model._meta
+    only = {opts.pk.name}
+    select_related = []
+
+    for name, selection_sets in get_node_fields(info).items():
+        try:
+            field = opts.get_field(name)
+        except FieldDoesNotExist:
+            continue
+
+        if not field.concrete or field.many_to_many:
+            continue
+
+        only.add(field.name)
+        if field.is_relation:
+            select_related.append(field.name)
+            if field.related_model is auth_models.User:
+                nested = collect_fields(info, selection_sets)
+                if any(profile_field in nested for profile_field in PROFILE_FIELDS):
+                    select_related.append('%s__profile' % field.name)
+
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    return queryset.only(*only)
+
+
+class OptimizedConnectionField(DjangoFilterConnectionField):
+    # Same as DjangoFilterConnectionField, but the queryset only loads the columns
+    # and joins the selection set asks for, before it gets paginated.
+    @classmethod
+    def connection_resolver(
+        cls,
+        resolver,
+        connection,
+        default_manager,
+        max_limit,
+        enforce_first_or_last,
+        filterset_class,
+        filtering_args,
+        root,
+        info,
+        **args
+    ):
+        def optimized_resolver(root, info, **args):
+            return optimize_queryset(resolver(root, info, **args), info)
+
+        filter_kwargs = {k: v for k, v in args.items() if k in filtering_args}
+        qs = filterset_class(
+            data=filter_kwargs,
+            queryset=optimize_queryset(default_manager.get_queryset(), info),
+            request=info.context,
+        ).qs
+
+        return super(DjangoFilterConnectionField, cls).connection_resolver(
+            optimized_resolver,
+            connection,
+            qs,
+            max_limit,
+            enforce_first_or_last,
+            root,
+            info,
+            **args
+        )
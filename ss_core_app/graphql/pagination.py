@@ -0,0 +1,196 @@
+import json
+import random
+
+from graphene.relay import PageInfo
+from graphql_relay.utils import base64, unbase64
+
+from django.db import connection as db_connection
+from django.db.models import F
+from django.db.models.query import Q, QuerySet
+
+from graphene_django.utils import maybe_queryset
+
+from .optimizer import OptimizedConnectionField
+
+PREFIX = 'seek:'
+
+
+def get_seek_keys(queryset):
+    # [(lookup, descending)] for the queryset ordering, with the primary key as the
+    # final tie-breaker, or None when the ordering cannot be seeked (e.g. '?').
+    keys = []
+    for order in queryset.query.order_by:
+        if not isinstance(order, str) or order == '?':
+            return None
+        if order.lstrip('-') in ('pk', 'id'):
+            keys.append(('pk', order.startswith('-')))
+            return keys
+        keys.append((order.lstrip('-'), order.startswith('-')))
+
+    keys.append(('pk', keys[-1][1] if keys else False))
+    return keys
+
+
+def nulls_largest():
+    return db_connection.vendor in ('postgresql', 'oracle')
+
+
+def to_cursor(values):
+    # isoformat() keeps the microseconds DjangoJSONEncoder would drop.
+    return base64(PREFIX + json.dumps(values, default=lambda value: value.isoformat()))
+
+
+def from_cursor(cursor):
+    try:
+        cursor = unbase64(cursor)
+    except Exception:
+        return None
+    if not cursor.startswith(PREFIX):
+        return None
+    try:
+        return json.loads(cursor[len(PREFIX):])
+    except ValueError:
+        return None
+
+
+def seek_filter(columns, values, forward):
+    # Rows strictly after `values` in the ordering given by `columns`, a list of
+    # (name, descending, nullable), or strictly before them when not `forward`.
+    # Returned as consecutive segments in scan order: NULLs of the leading column
+    # get their own segment, so the others stay index range scans.
+    (name, descending, nullable), value = columns[0], values[0]
+    rest = seek_filter(columns[1:], values[1:], forward) if len(columns) > 1 else []
+    rest = combine(rest)
+    greater = forward != descending
+
+    if value is None:
+        segments = [Q(**{name + '__isnull': True}) & rest] if rest is not None else []
+        if greater != nulls_largest():
+            segments.append(Q(**{name + '__isnull': False}))
+        return segments
+
+    beyond = Q(**{name + ('__gt' if greater else '__lt'): value})
+    if rest is not None:
+        bound = Q(**{name + ('__gte' if greater else '__lte'): value})
+        beyond = bound & (beyond | (Q(**{name: value}) & rest))
+    segments = [beyond]
+    if nullable and greater == nulls_largest():
+        segments.append(Q(**{name + '__isnull': True}))
+    return segments
+
+
+def combine(segments):
+    q = None
+    for segment in segments:
+        q = segment if q is None else q | segment
+    return q
+
+
+def random_sample(queryset, limit):
+    # Reads `limit` rows in random_key order from a random pivot, wrapping around
+    # to the start, instead of letting the database shuffle the whole table.
+    pivot = random.random()
+    queryset = queryset.order_by('random_key', 'pk')
+    nodes = list(queryset.filter(random_key__gte=pivot)[:limit])
+    if limit is None or len(nodes) < limit:
+        nodes += list(queryset.filter(random_key__lt=pivot)[:None if limit is None else limit - len(nodes)])
+    return nodes
+
+
+class KeysetConnectionField(OptimizedConnectionField):
+    # Paginates with an opaque cursor holding the ordering values and the id of the
+    # edge, so a deep page is a range scan instead of an OFFSET over every row before it.
+    # Offset cursors and orderings that cannot be seeked use the default pagination,
+    # except '?', which returns a single page sampled through the stored random_key.
+    @classmethod
+    def resolve_connection(cls, connection, default_manager, args, iterable):
+        resolved = maybe_queryset(iterable)
+        if resolved is None:
+            resolved = default_manager
+        if not isinstance(resolved, QuerySet):
+            return super(KeysetConnectionField, cls).resolve_connection(connection, default_manager, args, iterable)
+        if resolved is not default_manager:
+            resolved = cls.merge_querysets(default_manager, resolved)
+
+        if '?' in resolved.query.order_by and hasattr(resolved.model, 'random_key'):
+            nodes = random_sample(resolved, args.get('first') or args.get('last'))
+            return cls.build_connection(connection, resolved, nodes, ['pk'], False, False)
+
+        keys = get_seek_keys(resolved)
+        after = args.get('after')
+        before = args.get('before')
+        after_values = from_cursor(after) if after else None
+        before_values = from_cursor(before) if before else None
+        if keys is None or (after and after_values is None) or (before and before_values is None):
+            return super(KeysetConnectionField, cls).resolve_connection(connection, default_manager, args, iterable)
+
+        names = ['_seek_%d' % idx for idx in range(len(keys))]
+        queryset = resolved.annotate(**{name: F(lookup) for name, (lookup, descending) in zip(names, keys)})
+        fields = [queryset.query.annotations[name].output_field for name in names]
+        columns = [(name, descending, field.null) for name, (lookup, descending), field in zip(names, keys, fields)]
+        ordering = [('-' if descending else '') + name for name, descending, nullable in columns]
+
+        def parse(values):
+            if len(values) != len(fields):
+                raise Exception("Invalid cursor.")
+            return [None if value is None else field.to_python(value) for field, value in zip(fields, values)]
+
+        after_segments = seek_filter(columns, parse(after_values), True) if after_values is not None else None
+        before_segments = seek_filter(columns, parse(before_values), False) if before_values is not None else None
+
+        first = args.get('first')
+        last = args.get('last')
+        forward = first is not None or last is None
+        has_previous_page = has_next_page = False
+
+        if forward:
+            queryset = queryset.order_by(*ordering)
+            segments, other = after_segments, before_segments
+            limit = first
+        else:
+            queryset = queryset.order_by(*[order[1:] if order.startswith('-') else '-' + order for order in ordering])
+            segments, other = before_segments, after_segments
+            limit = last
+
+        if other is not None:
+            queryset = queryset.filter(combine(other) or Q(pk__in=[]))
+
+        nodes = []
+        for segment in (segments if segments is not None else [Q()]):
+            if limit is not None and len(nodes) > limit:
+                break
+            segment_queryset = queryset.filter(segment)
+            nodes += list(segment_queryset if limit is None else segment_queryset[:limit + 1 - len(nodes)])
+
+        if forward:
+            if first is not None and len(nodes) > first:
+                nodes = nodes[:first]
+                has_next_page = True
+            if last is not None and len(nodes) > last:
+                nodes = nodes[-last:]
+                has_previous_page = True
+        else:
+            if len(nodes) > last:
+                nodes = nodes[:last]
+                has_previous_page = True
+            nodes.reverse()
+
+        return cls.build_connection(connection, resolved, nodes, names, has_previous_page, has_next_page)
+
+    @classmethod
+    def build_connection(cls, connection, iterable, nodes, names, has_previous_page, has_next_page):
+        edges = [
+            connection.Edge(node=node, cursor=to_cursor([getattr(node, name) for name in names]))
+            for node in nodes
+        ]
+        result = connection(
+            edges=edges,
+            page_info=PageInfo(
+                start_cursor=edges[0].cursor if edges else None,
+                end_cursor=edges[-1].cursor if edges else None,
+                has_previous_page=has_previous_page,
+                has_next_page=has_next_page,
+            )
+        )
+        result.iterable = iterable
+        return result
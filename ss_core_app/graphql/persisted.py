@@ -0,0 +1,163 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from functools import partial
+
+from graphql.backend.base import GraphQLDocument
+from graphql.backend.core import GraphQLCoreBackend, execute_and_validate
+from graphql.execution import ExecutionResult
+from graphql.language.parser import parse
+from graphql.validation import validate
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError
+from django.http import HttpResponseBadRequest
+from graphene_django.views import HttpError
+
+from .. import models
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode('utf-8')).hexdigest()
+
+
+AUTOMATIC_PREFIX = 'graphql:persisted:'
+
+# Hashes known to be registered, so that a hot query never needs the database.
+# Only `manage.py register_queries` and staff register queries, which bounds it.
+registered_hashes = set()
+
+
+def register(query):
+    digest = query_hash(query)
+    if digest not in registered_hashes:
+        try:
+            models.PersistedQuery.objects.get_or_create(hash=digest, defaults={'query': query})
+        except IntegrityError:
+            # Registered concurrently by another request.
+            pass
+        registered_hashes.add(digest)
+    return digest
+
+
+def remember(query):
+    # Queries any client sends along with their hash are only kept in the cache,
+    # for GRAPHQL_PERSISTED_QUERY_TIMEOUT, so that they can grow neither the
+    # database nor the memory of a process.
+    digest = query_hash(query)
+    cache.set(AUTOMATIC_PREFIX + digest, query, settings.GRAPHQL_PERSISTED_QUERY_TIMEOUT)
+    return digest
+
+
+def is_registered(digest):
+    if digest not in registered_hashes:
+        if not models.PersistedQuery.objects.filter(hash=digest).exists():
+            return False
+        registered_hashes.add(digest)
+    return True
+
+
+def get_registered_query(digest, automatic=True):
+    # The query of `digest`, also looked up among the remembered ones with `automatic`.
+    if digest in registered_hashes:
+        document = document_backend.get(digest)
+        if document is not None:
+            return document.document_string
+
+    if automatic:
+        query = cache.get(AUTOMATIC_PREFIX + digest)
+        if query is not None:
+            return query
+
+    persisted = models.PersistedQuery.objects.filter(hash=digest).only('query').first()
+    if persisted is None:
+        return None
+    registered_hashes.add(digest)
+    return persisted.query
+
+
+class ValidatedDocumentBackend(GraphQLCoreBackend):
+    # Parses and validates every distinct query once. Valid documents are kept in an
+    # LRU of GRAPHQL_DOCUMENT_CACHE_SIZE entries keyed by query hash, and executed
+    # without validating them again.
+    def __init__(self, executor=None):
+        super(ValidatedDocumentBackend, self).__init__(executor)
+        self.lock = threading.Lock()
+        self.documents = OrderedDict()
+
+    def get(self, digest):
+        with self.lock:
+            document = self.documents.get(digest)
+            if document is not None:
+                self.documents.move_to_end(digest)
+            return document
+
+    def document_from_string(self, schema, document_string):
+        digest = query_hash(document_string)
+        document = self.get(digest)
+        if document is not None:
+            return document
+
+        document_ast = parse(document_string)
+        errors = validate(schema, document_ast)
+        if errors:
+            return GraphQLDocument(
+                schema=schema,
+                document_string=document_string,
+                document_ast=document_ast,
+                execute=lambda *args, **kwargs: ExecutionResult(errors=errors, invalid=True)
+            )
+
+        document = GraphQLDocument(
+            schema=schema,
+            document_string=document_string,
+            document_ast=document_ast,
+            execute=partial(execute_and_validate, schema, document_ast, validate=False, **self.execute_params)
+        )
+        with self.lock:
+            self.documents[digest] = document
+            while len(self.documents) > settings.GRAPHQL_DOCUMENT_CACHE_SIZE:
+                self.documents.popitem(last=False)
+        return document
+
+
+document_backend = ValidatedDocumentBackend()
+
+
+class PersistedQueryMixin:
+    # Accepts Apollo style persisted queries: `extensions.persistedQuery.sha256Hash`
+    # instead of, or along with, the query text. With `registered_only`, only
+    # registered queries run, whether sent by hash or in full.
+    registered_only = False
+
+    def get_backend(self, request):
+        return document_backend
+
+    def get_graphql_params(self, request, data):
+        query, variables, operation_name, id = super(PersistedQueryMixin, self).get_graphql_params(request, data)
+
+        extensions = request.GET.get('extensions') or data.get('extensions') or {}
+        if isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                raise HttpError(HttpResponseBadRequest("Extensions are invalid JSON."))
+        digest = (extensions.get('persistedQuery') or {}).get('sha256Hash')
+
+        if digest and not query:
+            query = get_registered_query(digest, automatic=not self.registered_only)
+            if query is None:
+                raise HttpError(HttpResponseBadRequest("PersistedQueryNotFound"))
+        elif digest and digest != query_hash(query):
+            raise HttpError(HttpResponseBadRequest("Provided sha256Hash does not match the query."))
+        elif query and self.registered_only:
+            if not is_registered(query_hash(query)):
+                raise HttpError(HttpResponseBadRequest("Only registered queries are allowed."))
+        elif digest and request.user.is_staff:
+            register(query)
+        elif digest:
+            remember(query)
+
+        return query, variables, operation_name, id
@@ -1,25 +1,51 @@
 import graphene
 from graphene import relay, InputObjectType
 from graphene_django import DjangoObjectType, DjangoConnectionField
-from graphene_django.filter import DjangoFilterConnectionField
 from django_filters import OrderingFilter, FilterSet, CharFilter
 
 from graphql_relay.node.node import to_global_id
 
+from django.conf import settings
 from django.db.models import Count, Case, When, Prefetch, Value, CharField, F, Sum
 from django.db.models.query import Q
 from django.db.models.functions import Concat
 from django.contrib.auth import models as auth_models
 
 from .. import models
+from ..images import key_for_url, variant_url
+from ..search import filter_by_search, VIDEO_INDEX, SPEAKER_INDEX, SOURCE_INDEX
+from ..subtitles import cue_window, search_cues
+from .loaders import get_loaders
+from .optimizer import optimize_queryset
+from .pagination import KeysetConnectionField
 
 
-class SubCategory(DjangoObjectType):
+ImageSize = graphene.Enum('ImageSize', [(size.upper(), size) for size in settings.IMAGE_SIZES])
+
+
+def resolve_variant(info, url, size):
+    # The URL of the `size` variant of `url` once it has been made, else `url`. The
+    # variants of all the images of a response are looked up in one query.
+    key = key_for_url(url)
+    if not size or key is None:
+        return url
+    return get_loaders(info).image_sizes.load(key).then(lambda sizes: variant_url(url, size, sizes))
+
+
+class ImageVariants:
+    # `image(size: SMALL)` resolves to a variant made by images.generate_variants.
+    image = graphene.String(size=ImageSize())
+
+    def resolve_image(self, info, size=None, **kwargs):
+        return resolve_variant(info, self.image, size)
+
+
+class SubCategory(ImageVariants, DjangoObjectType):
     class Meta:
         model = models.SubCategory
         
         
-class SpeakerBasic(DjangoObjectType):
+class SpeakerBasic(ImageVariants, DjangoObjectType):
     class Meta:
         model = models.Speaker
 
@@ -29,7 +55,7 @@ class TagBasic(DjangoObjectType):
         model = models.Tag
         
         
-class CategoryBasic(DjangoObjectType):
+class CategoryBasic(ImageVariants, DjangoObjectType):
     class Meta:
         model = models.Category
 
@@ -63,41 +89,58 @@ class VideoFilter(FilterSet):
     )
 
     def search_filter(self, queryset, name, value):
-        return queryset.filter(
-            Q(title__icontains=value) | \
-            Q(description__icontains=value) | \
-            Q(videospeaker__speaker__name__icontains=value)
-        )
+        return filter_by_search(queryset, VIDEO_INDEX, value)
+
+
+class CuePair(graphene.ObjectType):
+    # Tags cached responses, see cache.collect_tags.
+    model = models.Cue
 
+    start = graphene.Int()
+    end = graphene.Int()
+    vi = graphene.String()
+    en = graphene.String()
 
-class Video(DjangoObjectType):
+
+class Video(ImageVariants, DjangoObjectType):
     id = graphene.ID(required=True)
     speakers = graphene.List(SpeakerBasic)
     tags = graphene.List(TagBasic)
     categories = graphene.List(CategoryBasic)
     subcategories = graphene.List(SubCategory)
+    # The Vietnamese cues shown in [start, end) milliseconds with their English
+    # ones, for players to load subtitles a window at a time.
+    cue_pairs = graphene.List(CuePair, start=graphene.Int(required=True), end=graphene.Int(required=True))
 
     class Meta:
         model = models.Video
         interfaces = (relay.Node, )
     
     def resolve_speakers(self, info, **kwargs):
-        return models.Speaker.objects.filter(videospeaker__video=self)
+        return get_loaders(info).speakers_by_video.load(self.id)
     
     def resolve_tags(self, info, **kwargs):
-        return models.Tag.objects.filter(video=self)
+        return get_loaders(info).tags_by_video.load(self.id)
     
     def resolve_categories(self, info, **kwargs):
-        return models.Category.objects.filter(videocategory__video=self)
+        return get_loaders(info).categories_by_video.load(self.id)
         
     def resolve_subcategories(self, info, **kwargs):
-        return models.SubCategory.objects.filter(videosubcategory__video=self)
+        return get_loaders(info).subcategories_by_video.load(self.id)
+
+    def resolve_cue_pairs(self, info, start, end, **kwargs):
+        if start < 0 or end <= start:
+            raise Exception("The window must have 0 <= start < end.")
+        return get_loaders(info).cue_pairs.load(self.id).then(lambda cue_pairs: [
+            CuePair(start=pair_start, end=pair_end, vi=vi, en=en)
+            for pair_start, pair_end, vi, en in cue_window(cue_pairs, start, end)
+        ])
     
     
-class Speaker(DjangoObjectType):
+class Speaker(ImageVariants, DjangoObjectType):
     id = graphene.ID(required=True)
     video_amount = graphene.Int()
-    video_set = DjangoFilterConnectionField(Video, filterset_class=VideoFilter)
+    video_set = KeysetConnectionField(Video, filterset_class=VideoFilter)
 
     class Meta:
         model = models.Speaker
@@ -107,10 +150,10 @@ class Speaker(DjangoObjectType):
         return models.Video.objects.filter(videospeaker__speaker=self)
 
 
-class Source(DjangoObjectType):
+class Source(ImageVariants, DjangoObjectType):
     id = graphene.ID(required=True)
     video_amount = graphene.Int()
-    video_set = DjangoFilterConnectionField(Video, filterset_class=VideoFilter)
+    video_set = KeysetConnectionField(Video, filterset_class=VideoFilter)
 
     class Meta:
         model = models.Source
@@ -123,13 +166,13 @@ class User(DjangoObjectType):
     name = graphene.String()
     description = graphene.String()
     quote = graphene.String()
-    avatar = graphene.String()
-    image = graphene.String()
-    cover = graphene.String()
+    avatar = graphene.String(size=ImageSize())
+    image = graphene.String(size=ImageSize())
+    cover = graphene.String(size=ImageSize())
     website = graphene.String()
     facebook = graphene.String()
     video_amount = graphene.Int()
-    video_set = DjangoFilterConnectionField(Video, filterset_class=VideoFilter)
+    video_set = KeysetConnectionField(Video, filterset_class=VideoFilter)
 
     class Meta:
         model = auth_models.User
@@ -152,14 +195,14 @@ class User(DjangoObjectType):
     def resolve_quote(self, info, **kwargs):
         return self.profile.quote
 
-    def resolve_avatar(self, info, **kwargs):
-        return self.profile.avatar
+    def resolve_avatar(self, info, size=None, **kwargs):
+        return resolve_variant(info, self.profile.avatar, size)
 
-    def resolve_image(self, info, **kwargs):
-        return self.profile.avatar
+    def resolve_image(self, info, size=None, **kwargs):
+        return resolve_variant(info, self.profile.avatar, size)
 
-    def resolve_cover(self, info, **kwargs):
-        return self.profile.cover
+    def resolve_cover(self, info, size=None, **kwargs):
+        return resolve_variant(info, self.profile.cover, size)
 
     def resolve_website(self, info, **kwargs):
         return self.profile.website
@@ -168,10 +211,10 @@ class User(DjangoObjectType):
         return self.profile.facebook
         
         
-class Category(DjangoObjectType):
+class Category(ImageVariants, DjangoObjectType):
     id = graphene.ID(required=True)
     video_amount = graphene.Int()
-    video_set = DjangoFilterConnectionField(Video, filterset_class=VideoFilter)
+    video_set = KeysetConnectionField(Video, filterset_class=VideoFilter)
     subcategories = graphene.List(SubCategory, order_by=graphene.String(default_value="priority"))
 
     class Meta:
@@ -188,7 +231,7 @@ class Category(DjangoObjectType):
 
 class Tag(DjangoObjectType):
     video_amount = graphene.Int()
-    video_set = DjangoFilterConnectionField(Video, filterset_class=VideoFilter)
+    video_set = KeysetConnectionField(Video, filterset_class=VideoFilter)
     
     class Meta:
         model = models.Tag
@@ -198,9 +241,9 @@ class Tag(DjangoObjectType):
         return models.Video.objects.filter(tag=self)
         
         
-class Playlist(DjangoObjectType):
+class Playlist(ImageVariants, DjangoObjectType):
     video_amount = graphene.Int()
-    video_set = DjangoFilterConnectionField(Video, filterset_class=VideoFilter)
+    video_set = KeysetConnectionField(Video, filterset_class=VideoFilter)
 
     class Meta:
         model = models.Playlist
@@ -210,10 +253,28 @@ class Playlist(DjangoObjectType):
         return models.Video.objects.filter(playlistvideo__playlist=self)
     
     
+class Cue(graphene.ObjectType):
+    # Tags cached responses, see cache.collect_tags.
+    model = models.Cue
+
+    language = graphene.String()
+    start = graphene.Int()
+    end = graphene.Int()
+    text = graphene.String()
+
+
+class CueMatch(graphene.ObjectType):
+    video = graphene.Field(Video)
+    cues = graphene.List(Cue)
+
+
 class SearchList(graphene.ObjectType):
     videos = DjangoConnectionField(Video)
     speakers = DjangoConnectionField(Speaker)
     sources = DjangoConnectionField(Source)
+
+    def resolve_videos(self, info, **kwargs):
+        return optimize_queryset(self.videos, info)
     
 
 class Query(graphene.ObjectType):
@@ -227,7 +288,7 @@ class Query(graphene.ObjectType):
             return None
     
     
-    videos = DjangoFilterConnectionField(Video, filterset_class=VideoFilter)
+    videos = KeysetConnectionField(Video, filterset_class=VideoFilter)
     
     
     menus = graphene.List(Menu)
@@ -297,22 +358,31 @@ class Query(graphene.ObjectType):
     
     search_list = graphene.Field(SearchList, query=graphene.String())
     def resolve_search_list(self, info, query, **kwargs):
-        videos = models.Video.objects\
-            .filter(
-                Q(title__icontains=query) |\
-                Q(description__icontains=query),
-                is_published=True
-            ).order_by('-published_at')
-        
-        speakers = models.Speaker.objects\
-            .annotate(video_amount=Count(Case(When(videospeaker__video__is_published=True, then=1))))\
-            .filter(Q(name__icontains=query))
+        videos = filter_by_search(
+            models.Video.objects.filter(is_published=True).order_by('-published_at'),
+            VIDEO_INDEX,
+            query
+        )
+        
+        speakers = filter_by_search(models.Speaker.objects.all(), SPEAKER_INDEX, query)
             
-        sources = models.Source.objects\
-            .annotate(video_amount=Count(Case(When(video__is_published=True, then=1))))\
-            .filter(Q(name__icontains=query))
+        sources = filter_by_search(models.Source.objects.all(), SOURCE_INDEX, query)
         
         return SearchList(videos=videos, speakers=speakers, sources=sources)
+
+
+    cue_search = graphene.List(
+        CueMatch,
+        query=graphene.String(),
+        language=graphene.String(default_value=""),
+        first=graphene.Int(default_value=10),
+        cues_per_video=graphene.Int(default_value=5)
+    )
+    def resolve_cue_search(self, info, query, language, first, cues_per_video, **kwargs):
+        return [
+            CueMatch(video=video, cues=cues)
+            for video, cues in search_cues(query, language, first, cues_per_video)
+        ]
         
             
     sources = DjangoConnectionField(Source, order_by=graphene.String(default_value=""), search=graphene.String(default_value=""))
@@ -327,7 +397,6 @@ class Query(graphene.ObjectType):
                 Q(name__icontains=search) |\
                 Q(description__icontains=search)\
             )\
-            .annotate(video_amount=Count(Case(When(video__is_published=True, then=1))))\
             .order_by(*orders)
             #.filter(video_amount__gt=0)\
             
@@ -341,7 +410,7 @@ class Query(graphene.ObjectType):
         
         return auth_models.User.objects\
             .filter(profile__role="SP")\
-            .annotate(video_amount=Count(Case(When(video_sponsor_by__is_published=True, then=1))))\
+            .annotate(video_amount=F('profile__sponsored_video_amount'))\
             .order_by(*orders)
             # .filter(video_amount__gt=0)\
             
@@ -355,7 +424,7 @@ class Query(graphene.ObjectType):
         
         return auth_models.User.objects\
             .filter(profile__role="PO")\
-            .annotate(video_amount=Count(Case(When(video_created_by__is_published=True, then=1))))\
+            .annotate(video_amount=F('profile__created_video_amount'))\
             .order_by(*orders)
             # .filter(video_amount__gt=0)\
 
@@ -372,7 +441,6 @@ class Query(graphene.ObjectType):
                 Q(name__icontains=search) |\
                 Q(description__icontains=search)\
             )\
-            .annotate(video_amount=Count(Case(When(videospeaker__video__is_published=True, then=1))))\
             .order_by(*orders)
             
             
@@ -385,7 +453,6 @@ class Query(graphene.ObjectType):
             orders = ('-video_amount', )
         
         return models.Category.objects\
-            .annotate(video_amount=Count(Case(When(videocategory__video__is_published=True, then=1))))\
             .order_by(*orders)
             # .filter(video_amount__gt=0)\
 
@@ -411,6 +478,5 @@ class Query(graphene.ObjectType):
             orders = ('-video_amount', )
         
         return models.Playlist.objects\
-            .annotate(video_amount=Count(Case(When(playlistvideo__video__is_published=True, then=1))))\
             .order_by(*orders)
             # .filter(video_amount__gt=0)\
@@ -0,0 +1,127 @@
+import io
+import os
+
+from PIL import Image, ImageOps
+
+from django.conf import settings
+from django.db import IntegrityError
+
+from . import models, storage
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp')
+
+# Keys per `IN (...)` lookup, under SQLite's bound-parameter limit
+MAX_BATCH_SIZE = 500
+
+
+def key_for_url(url):
+    # The key of an image uploaded to our bucket, or None.
+    prefix = storage.public_url('')
+    if not url or not url.startswith(prefix):
+        return None
+    key = url[len(prefix):]
+    return key if os.path.splitext(key)[1].lower() in IMAGE_EXTENSIONS else None
+
+
+def variant_key(key, size):
+    # Deterministic, so generating twice writes the same objects.
+    return '%s.%s.jpg' % (key, size)
+
+
+def variant_url(url, size, sizes):
+    # The URL of the `size` variant of an image, or the image itself when that
+    # variant is not among the `sizes` made of it.
+    key = key_for_url(url)
+    if not size or key is None or size not in sizes:
+        return url
+    return storage.public_url(variant_key(key, size))
+
+
+def get_sizes(keys):
+    # {key: set of sizes} of the variants recorded for `keys`.
+    sizes = {key: set() for key in keys}
+    keys = list(sizes)
+    for start in range(0, len(keys), MAX_BATCH_SIZE):
+        variants = models.ImageVariant.objects\
+            .filter(key__in=keys[start:start + MAX_BATCH_SIZE])\
+            .values_list('key', 'size')
+        for key, size in variants:
+            sizes[key].add(size)
+    return sizes
+
+
+def enqueue(key):
+    # Leaves an uploaded image to generate_image_variants, which makes its variants
+    # out of the request.
+    if os.path.splitext(key)[1].lower() not in IMAGE_EXTENSIONS:
+        return
+    try:
+        models.PendingImage.objects.get_or_create(key=key)
+    except IntegrityError:
+        # Enqueued concurrently
+        pass
+
+
+def record_variants(key, sizes):
+    for size in sizes:
+        try:
+            models.ImageVariant.objects.get_or_create(key=key, size=size)
+        except IntegrityError:
+            # Recorded concurrently
+            pass
+
+
+def resize(original, width):
+    image = original.copy()
+    image.thumbnail((width, width * 4), Image.LANCZOS)
+    output = io.BytesIO()
+    image.save(output, 'JPEG', quality=settings.IMAGE_QUALITY, optimize=True, progressive=True)
+    output.seek(0)
+    return output
+
+
+def open_image(data, width):
+    image = Image.open(io.BytesIO(data))
+    # Lets the JPEG decoder scale down by up to 8 while decoding.
+    image.draft('RGB', (width, width))
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.split()[-1])
+        return background
+    return image.convert('RGB')
+
+
+def make_variants(key, force=False):
+    # Stores every IMAGE_SIZES variant of `key` that is missing from the bucket, and
+    # returns (sizes found there, sizes it made). Touches no database, so threads
+    # can run it.
+    client = storage.get_client()
+    if force:
+        existing = set()
+    else:
+        listed = client.list_objects_v2(Bucket=settings.AWS_BUCKET, Prefix=key + '.')
+        existing = set(item['Key'] for item in listed.get('Contents', []))
+
+    found = [size for size in settings.IMAGE_SIZES if variant_key(key, size) in existing]
+    missing = [size for size in settings.IMAGE_SIZES if size not in found]
+    if not missing:
+        return found, []
+
+    data = client.get_object(Bucket=settings.AWS_BUCKET, Key=key)['Body'].read()
+    original = open_image(data, max(settings.IMAGE_SIZES[size] for size in missing))
+    for size in missing:
+        storage.upload(resize(original, settings.IMAGE_SIZES[size]), variant_key(key, size), {
+            'ACL': 'public-read',
+            'ContentType': 'image/jpeg',
+            'CacheControl': 'public, max-age=31536000',
+        })
+    return found, missing
+
+
+def generate_variants(key, force=False):
+    # make_variants, recording every variant of `key`; returns the sizes it made.
+    found, made = make_variants(key, force)
+    record_variants(key, found + made)
+    return made
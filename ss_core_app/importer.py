@@ -0,0 +1,287 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DatabaseError, transaction
+from django.utils.dateparse import parse_datetime
+
+from . import models, forms, sitemap
+from .counters import VideoAmountTracker, refresh_video_amounts, keys_for
+from .relations import field_error, unique, get_tag_slugs, diff_related, write_related
+from .search import index_videos
+from .subtitles import clear_cues
+
+INVALID_CHOICE = "Select a valid choice. That choice is not one of the available choices."
+
+# Compared with the stored video to tell whether an import changes it
+FIELDS = forms.VideoBatchImportForm._meta.fields + ('created_by_id', 'published_by_id', 'source_id', 'sponsor_id')
+
+# In the order of the relations built by build_video
+RELATIONS = (
+    (models.VideoSpeaker, 'speaker'),
+    (models.VideoCategory, 'category'),
+    (models.VideoSubCategory, 'subcategory'),
+    (models.Tag, 'slug'),
+)
+
+
+def parse_timestamp(field, value):
+    # Exported as 2018-01-31T12:00:00.000000+07:00. The offset is required, a naive
+    # time would be read in whatever zone the server is in.
+    if value is None:
+        return None
+    try:
+        parsed = parse_datetime(value)
+    except (TypeError, ValueError):
+        parsed = None
+    if parsed is None or parsed.tzinfo is None:
+        raise field_error(field, "Enter a valid date/time.", "invalid")
+    return parsed
+
+
+def slug_map(model, slugs):
+    return dict(model.objects.filter(slug__in=set(slugs)).values_list('slug', 'pk'))
+
+
+class Lookups:
+    # Every username and slug referenced by a batch, resolved with one query per model.
+    def __init__(self, items):
+        usernames = {"admin"}
+        for item in items:
+            usernames.update(username for username in (item.get('created_by'), item.get('published_by'), item.get('sponsor')) if username)
+
+        self.users = dict(User.objects.filter(username__in=usernames).values_list('username', 'pk'))
+        self.sources = slug_map(models.Source, [item.get('source') for item in items if item.get('source')])
+        self.speakers = slug_map(models.Speaker, [slug for item in items for slug in item.get('speakers') or []])
+        self.categories = slug_map(models.Category, [slug for item in items for slug in item.get('categories') or []])
+        # Subcategory slugs are only unique within a category: {slug: {category id: pk}}
+        self.subcategories = {}
+        for pk, category_id, slug in models.SubCategory.objects \
+                .filter(slug__in={slug for item in items for slug in item.get('subcategories') or []}) \
+                .values_list('pk', 'category', 'slug'):
+            self.subcategories.setdefault(slug, {})[category_id] = pk
+
+    def get(self, mapping, field, key):
+        if key not in mapping:
+            raise field_error(field, INVALID_CHOICE, "invalid_choice")
+        return mapping[key]
+
+    def get_subcategory(self, slug, category_ids):
+        # The subcategory in one of the video's categories, or else the only one with the slug.
+        candidates = self.subcategories.get(slug, {})
+        matches = [pk for category_id, pk in candidates.items() if category_id in category_ids] or list(candidates.values())
+        if not matches:
+            raise field_error('subcategory', INVALID_CHOICE, "invalid_choice")
+        if len(matches) > 1:
+            raise field_error(
+                'subcategory',
+                "Subcategory %s is in more than one category, add the category it belongs to." % slug,
+                "ambiguous"
+            )
+        return matches[0]
+
+
+def build_video(item, lookups):
+    # An unsaved video and its (speaker ids, category ids, subcategory ids, tag slugs),
+    # or an exception with form style errors. Reads nothing but `lookups`.
+    form = forms.VideoBatchImportForm({
+        "slug": item.get('slug'),
+        "title": item.get('title'),
+        "description": item.get('description'),
+        "image": item.get('image'),
+        "video_id": item.get('video_id'),
+        "duration": item.get('duration'),
+        "vi_sub": item.get('vi_sub'),
+        "en_sub": item.get('en_sub'),
+        "vi_transcript": item.get('vi_transcript') or "",
+        "en_transcript": item.get('en_transcript') or "",
+        "view_amount": item.get('view_amount'),
+        "is_published": item.get('is_published'),
+        "created_at": parse_timestamp('created_at', item.get('created_at')),
+        "published_at": parse_timestamp('published_at', item.get('published_at')),
+    })
+
+    if not form.is_valid():
+        raise Exception(form.errors.as_json())
+
+    video = form.save(commit=False)
+    video.created_by_id = lookups.users.get(item.get('created_by')) or lookups.get(lookups.users, 'created_by', "admin")
+    video.published_by_id = lookups.get(lookups.users, 'published_by', item['published_by']) if item.get('published_by') else None
+    video.source_id = lookups.get(lookups.sources, 'source', item['source']) if item.get('source') else None
+    video.sponsor_id = lookups.get(lookups.users, 'sponsor', item['sponsor']) if item.get('sponsor') else None
+
+    category_ids = [lookups.get(lookups.categories, 'category', slug) for slug in unique(item.get('categories') or [])]
+    relations = (
+        [lookups.get(lookups.speakers, 'speaker', slug) for slug in unique(item.get('speakers') or [])],
+        category_ids,
+        unique(lookups.get_subcategory(slug, category_ids) for slug in item.get('subcategories') or []),
+        get_tag_slugs(item.get('tags') or []),
+    )
+    return video, relations
+
+
+def write_videos(entries):
+    # Creates the videos of `entries` ([(video, relations)]) that are new and
+    # updates the ones whose slug exists in place, keeping their ids and playlists.
+    # Rows that already match are not written. Use inside a transaction.
+    existing = models.Video.objects.in_bulk([video.slug for video, relations in entries], field_name='slug')
+
+    changes = {}
+    for video, relations in entries:
+        old = existing.get(video.slug)
+        if old is None:
+            continue
+        video.pk = old.pk
+        video._state.adding = False
+        video.random_key = old.random_key
+        video.updated_at = old.updated_at
+        video.updated_by_id = old.updated_by_id
+        changed = {field: getattr(video, field) for field in FIELDS if getattr(video, field) != getattr(old, field)}
+        if changed:
+            changes[video.pk] = changed
+
+    diffs = [
+        diff_related(through, field, {video.pk: relations[position] for video, relations in entries if video.pk})
+        for position, (through, field) in enumerate(RELATIONS)
+    ]
+    changed_ids = set(changes)
+    for stale, missing in diffs:
+        changed_ids.update(stale.values())
+        changed_ids.update(row.video_id for row in missing)
+
+    video_amounts = VideoAmountTracker(changed_ids)
+    clear_cues([pk for pk, changed in changes.items() if 'vi_sub' in changed or 'en_sub' in changed])
+    for pk, changed in changes.items():
+        models.Video.objects.filter(pk=pk).update(**changed)
+
+    new_videos = [(video, relations) for video, relations in entries if video.pk is None]
+    if new_videos:
+        models.Video.objects.bulk_create([video for video, relations in new_videos])
+        # bulk_create only sets primary keys on PostgreSQL.
+        ids = dict(models.Video.objects.filter(slug__in=[video.slug for video, relations in new_videos]).values_list('slug', 'pk'))
+        for video, relations in new_videos:
+            video.pk = ids[video.slug]
+            video._state.adding = False
+            for (through, field), targets, (stale, missing) in zip(RELATIONS, relations, diffs):
+                attname = through._meta.get_field(field).attname
+                missing.extend(through(video_id=video.pk, **{attname: value}) for value in targets)
+        changed_ids.update(ids.values())
+
+    for (through, field), (stale, missing) in zip(RELATIONS, diffs):
+        write_related(through, stale, missing)
+
+    if changed_ids:
+        video_amounts.refresh(changed_ids)
+        index_videos(list(changed_ids))
+        sitemap.invalidate(changed_ids)
+
+
+def import_videos(items, chunk_size=None):
+    # Imports `items` (ImportVideo arguments) in transactions of `chunk_size`, and
+    # returns (video, errors) for each of them. An invalid item does not stop the
+    # others.
+    chunk_size = chunk_size or settings.IMPORT_CHUNK_SIZE
+    lookups = Lookups(items)
+    results = [(None, None)] * len(items)
+    seen = set()
+
+    for start in range(0, len(items), chunk_size):
+        entries = []
+        for index in range(start, min(start + chunk_size, len(items))):
+            try:
+                video, relations = build_video(items[index], lookups)
+                if video.slug in seen:
+                    raise field_error('slug', "Video with this Slug already exists.", "unique")
+            except Exception as e:
+                results[index] = (None, str(e))
+                continue
+            seen.add(video.slug)
+            entries.append((index, video, relations))
+
+        if not entries:
+            continue
+
+        try:
+            with transaction.atomic():
+                write_videos([(video, relations) for index, video, relations in entries])
+        except DatabaseError:
+            # Find out which ones failed.
+            for index, video, relations in entries:
+                video.pk = None
+                video._state.adding = True
+                try:
+                    with transaction.atomic():
+                        write_videos([(video, relations)])
+                except DatabaseError as e:
+                    results[index] = (None, str(e))
+                else:
+                    results[index] = (video, None)
+        else:
+            for index, video, relations in entries:
+                results[index] = (video, None)
+
+    return results
+
+
+def import_user(item):
+    # Creates a user and their profile from ImportUser arguments. Use inside a
+    # transaction.
+    user_form = forms.UserForm({
+        "username": item.get('username'),
+        "first_name": item.get('name') or "",
+        "email": item.get('email') or "",
+    })
+
+    if not user_form.is_valid():
+        raise Exception(user_form.errors.as_json())
+
+    user = user_form.save()
+
+    profile_form = forms.ProfileForm({
+        "user": user.id,
+        "role": item.get('role'),
+        "quote": item.get('quote') or "",
+        "bio": item.get('bio') or "",
+        "avatar": item.get('avatar') or "",
+        "cover": item.get('cover') or "",
+        "facebook": item.get('facebook') or "",
+        "website": item.get('website') or "",
+    })
+
+    if not profile_form.is_valid():
+        raise Exception(profile_form.errors.as_json())
+
+    profile_form.save()
+
+    refresh_video_amounts(keys_for(models.Profile, [user.id]))
+
+    return user
+
+
+def import_playlist(item):
+    # Creates a playlist of the videos with the given slugs, in order, from
+    # ImportPlaylist arguments. Use inside a transaction.
+    playlist_form = forms.PlaylistForm({
+        "slug": item.get('slug'),
+        "name": item.get('name'),
+        "description": item.get('description'),
+        "image": item.get('image'),
+    })
+
+    if not playlist_form.is_valid():
+        raise Exception(playlist_form.errors.as_json())
+
+    slugs = unique(item.get('videos') or [])
+    video_ids = slug_map(models.Video, slugs)
+    for slug in slugs:
+        if slug not in video_ids:
+            raise field_error('video', INVALID_CHOICE, "invalid_choice")
+
+    playlist = playlist_form.save()
+
+    models.PlaylistVideo.objects.bulk_create([
+        models.PlaylistVideo(playlist=playlist, video_id=video_ids[slug], priority=idx+1)
+        for idx, slug in enumerate(slugs)
+    ])
+
+    refresh_video_amounts(keys_for(models.Playlist, [playlist.id]))
+
+    return playlist
@@ -0,0 +1,55 @@
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+from graphql_relay.utils import base64
+
+from ... import models
+from ...benchmarks import best_of, create_videos
+from ...graphql.pagination import to_cursor
+from ...graphql.schema import schema
+
+QUERY = '''query($after: String, $orderBy: String) {
+  videos(first: 20, after: $after, orderBy: $orderBy) { edges { node { slug title } } }
+}'''
+
+
+class Command(BaseCommand):
+    help = 'Times pages of the videos connection at several depths, with offset and with seek cursors. ' \
+        'The videos are created in a transaction that is rolled back.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--videos', type=int, default=50000)
+        parser.add_argument('--order-by', default='-published_at,-view_amount,duration',
+            help='Comma separated orderings to time.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            create_videos(options['videos'])
+            self.report(options['videos'], [order.strip() for order in options['order_by'].split(',')])
+            transaction.set_rollback(True)
+
+    def report(self, count, orderings):
+        request = RequestFactory().post('/graphql/')
+        request.user = AnonymousUser()
+
+        def page(order, after):
+            result = schema.execute(QUERY, context_value=request, variable_values={'after': after, 'orderBy': order})
+            if result.errors:
+                raise result.errors[0]
+
+        self.stdout.write('%-16s %8s %12s %12s' % ('order', 'depth', 'offset ms', 'seek ms'))
+        for order in orderings:
+            field = order.lstrip('-')
+            videos = models.Video.objects.filter(is_published=True).order_by(order, '-pk' if order.startswith('-') else 'pk')
+            for depth in (0, count // 2, count - 20):
+                if depth:
+                    video = videos[depth - 1:depth].get()
+                    offset_cursor = base64('arrayconnection:%d' % (depth - 1))
+                    seek_cursor = to_cursor([getattr(video, field), video.pk])
+                else:
+                    offset_cursor = seek_cursor = None
+                self.stdout.write('%-16s %8d %12.1f %12.1f' % (
+                    order, depth,
+                    best_of(lambda: page(order, offset_cursor)) * 1000,
+                    best_of(lambda: page(order, seek_cursor)) * 1000))
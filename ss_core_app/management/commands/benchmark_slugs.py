@@ -0,0 +1,61 @@
+import random
+import re
+import timeit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...utils import VIETNAMESE_LETTERS, convert, name_to_slug
+
+WORDS = 'Tiếng Việt khoa học giáo dục Đà Nẵng phát triển bản thân kỹ năng sống hạnh phúc tình yêu ' \
+    'Ước mơ ĐIỀU KỲ DIỆU'.split()
+
+# The fourteen substitutions, a class per letter in each case, that FOLD_TABLE replaced
+PATTERNS = [
+    (re.compile('[%s]' % letters), base) for base, letters in VIETNAMESE_LETTERS.items()
+] + [
+    (re.compile('[%s]' % letters.upper()), base.upper()) for base, letters in VIETNAMESE_LETTERS.items()
+]
+
+
+def regex_convert(text):
+    for pattern, base in PATTERNS:
+        text = pattern.sub(base, text)
+    return text
+
+
+def regex_slug(name):
+    return re.sub(r'\W+', '-', regex_convert(name).lower()).strip('-')
+
+
+class Command(BaseCommand):
+    help = 'Times name_to_slug and convert on Vietnamese tags and text, against the regex substitutions ' \
+        'they replaced.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tags', type=int, default=300)
+        parser.add_argument('--number', type=int, default=20, help='Runs over the tags to average.')
+
+    def handle(self, *args, **options):
+        rng = random.Random(1)
+        tags = [' '.join(rng.sample(WORDS, 3)) for _ in range(options['tags'])]
+        text = ' '.join(rng.choice(WORDS) for _ in range(400))
+
+        if [regex_slug(tag) for tag in tags] != [name_to_slug(tag) for tag in tags] \
+                or regex_convert(text) != convert(text):
+            raise CommandError("The translation table and the substitutions disagree.")
+
+        number = options['number']
+        for label, fn in (
+            ('slug, regex', regex_slug),
+            ('slug, uncached', name_to_slug.__wrapped__),
+            ('slug, cached', name_to_slug),
+        ):
+            elapsed = timeit.timeit(lambda: [fn(tag) for tag in tags], number=number)
+            self.stdout.write('%-20s %8.2f us per tag' % (label, elapsed / number / len(tags) * 1e6))
+
+        for label, fn in (
+            ('convert, regex', regex_convert),
+            ('convert', convert),
+        ):
+            elapsed = timeit.timeit(lambda: fn(text), number=number * 10)
+            self.stdout.write('%-20s %8.1f us per %.1f KB' % (label, elapsed / number / 10 * 1e6, len(text.encode('utf-8')) / 1000))
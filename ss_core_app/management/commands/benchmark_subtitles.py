@@ -0,0 +1,51 @@
+import io
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ...benchmarks import best_of, with_peak
+from ...subtitles import parse_srt, read_srt, to_json, to_vtt, vtt_timestamp
+
+WORDS = ['xin', 'chào', 'các', 'bạn', '<i>hello</i>', 'world', 'talk']
+
+
+def generate_srt(hours):
+    # An SRT file of about 1150 cues an hour, some on two lines.
+    rng = random.Random(1)
+    blocks = []
+    start = 0
+    while start < hours * 60 * 60 * 1000:
+        end = start + rng.randint(1500, 4500)
+        text = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(4, 14)))
+        if rng.random() < 0.3:
+            text += '\nsecond line here'
+        blocks.append('%d\n%s --> %s\n%s\n' % (
+            len(blocks) + 1, vtt_timestamp(start).replace('.', ','), vtt_timestamp(end).replace('.', ','), text))
+        start = end + rng.randint(0, 300)
+    return '\ufeff' + '\n'.join(blocks)
+
+
+class Command(BaseCommand):
+    help = 'Times parsing generated SRT files from text and streamed from bytes, and sizes their compiled forms.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', default='1,3,10', help='Comma separated lengths of the files.')
+
+    def handle(self, *args, **options):
+        for hours in [float(hours) for hours in options['hours'].split(',')]:
+            text = generate_srt(hours)
+            content = text.encode('utf-8')
+            cues, errors = read_srt(io.BytesIO(content))
+            if errors or cues != parse_srt(text):
+                raise CommandError("read_srt and parse_srt disagree on the generated file.")
+
+            self.stdout.write('%gh, %d cues, %d KB' % (hours, len(cues), len(content) // 1024))
+            for label, fn in (
+                ('parse_srt', lambda: parse_srt(content.decode('utf-8'))),
+                ('read_srt', lambda: read_srt(io.BytesIO(content))),
+            ):
+                elapsed = best_of(fn)
+                peak = with_peak(fn)[1]
+                self.stdout.write('  %-12s %8.1f ms  %6.1f MB peak' % (label, elapsed * 1000, peak / 1e6))
+            self.stdout.write('  JSON %d KB, WebVTT %d KB' % (
+                len(to_json(cues).encode('utf-8')) // 1024, len(to_vtt(cues).encode('utf-8')) // 1024))
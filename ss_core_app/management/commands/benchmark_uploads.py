@@ -0,0 +1,71 @@
+import io
+import json
+import os
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import RequestFactory
+from django.test.client import BOUNDARY, encode_multipart
+from rest_framework.authtoken.models import Token
+
+from ... import apis, models, storage
+from ...benchmarks import best_of, with_peak
+
+
+class Command(BaseCommand):
+    help = 'Times files posted to /api/upload/, streamed to the S3 compatible store at AWS_ENDPOINT_URL, ' \
+        'against upload_fileobj of the same bytes, and sizes the memory both take. The uploaded objects are ' \
+        'deleted, the poster is created in a transaction that is rolled back.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1,20,100', help='Comma separated sizes of the files, in MB.')
+        parser.add_argument('--repeat', type=int, default=3, help='Uploads to take the fastest of.')
+
+    def handle(self, *args, **options):
+        if not settings.AWS_ENDPOINT_URL:
+            raise CommandError("Set AWS_ENDPOINT_URL to a local S3 compatible stub, files are uploaded to it.")
+
+        with transaction.atomic():
+            user = User.objects.create(username='benchmark-%d' % time.time())
+            models.Profile.objects.create(user=user, role=models.Profile.POSTER)
+            token = Token.objects.create(user=user).key
+            keys = []
+            try:
+                for size in [float(size) for size in options['sizes'].split(',')]:
+                    self.report(size, token, options['repeat'], keys)
+            finally:
+                for key in keys:
+                    storage.get_client().delete_object(Bucket=settings.AWS_BUCKET, Key=key)
+            transaction.set_rollback(True)
+
+    def report(self, size, token, repeat, keys):
+        content = os.urandom(int(size * 1024 * 1024))
+        body = encode_multipart(BOUNDARY, {'upload_file': SimpleUploadedFile('benchmark.bin', content)})
+        factory = RequestFactory()
+
+        def post():
+            # A request body can be read once, so each upload builds its request.
+            request = factory.post('/api/upload/', body, content_type='multipart/form-data; boundary=%s' % BOUNDARY,
+                HTTP_AUTHORIZATION='Token ' + token)
+            result = json.loads(apis.upload_file(request).content.decode('utf-8'))
+            if not result['is_success']:
+                raise CommandError(result['detail'])
+            keys.append(result['detail'][len(storage.public_url('')):])
+
+        def upload_fileobj():
+            key = storage.unique_key('', 'benchmark.bin')
+            keys.append(key)
+            storage.upload(io.BytesIO(content), key, storage.upload_args('benchmark.bin', 'benchmark'))
+
+        self.stdout.write('%g MB' % size)
+        for label, fn in (
+            ('api/upload', post),
+            ('upload_fileobj', upload_fileobj),
+        ):
+            elapsed = best_of(fn, repeat)
+            peak = with_peak(fn)[1]
+            self.stdout.write('  %-16s %8.1f MB/s  %6.1f MB peak' % (label, size / elapsed, peak / 1e6))
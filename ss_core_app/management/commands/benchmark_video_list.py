@@ -0,0 +1,49 @@
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+
+from ... import models, views
+from ...benchmarks import best_of, with_peak, create_videos
+from ...graphql.schema import schema
+
+QUERY = '{ videos(first: 100) { edges { node { slug title } } } }'
+
+
+class Command(BaseCommand):
+    help = 'Times the video list page and a GraphQL video list against videos with long transcripts. ' \
+        'The videos are created in a transaction that is rolled back.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--videos', type=int, default=50000)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            create_videos(options['videos'])
+            self.report()
+            transaction.set_rollback(True)
+
+    def report(self):
+        videos = models.Video.objects.filter(is_published=True).order_by('-published_at')
+        request = RequestFactory().get('/ss/')
+        request.user = AnonymousUser()
+
+        for label, fn in (
+            ('every column', lambda: list(videos)),
+            ('slug and title', lambda: list(videos.only('slug', 'title'))),
+            ('/ss/ page', lambda: views.video_list(request)),
+        ):
+            elapsed, peak = with_peak(fn)
+            self.stdout.write('%-20s %8.2f s  %8.1f MB peak' % (label, elapsed, peak / 1e6))
+
+        elapsed = best_of(lambda: schema.execute(QUERY, context_value=request))
+        self.stdout.write('%-20s %8.1f ms' % ('videos(first: 100)', elapsed * 1000))
+
+        with connection.cursor() as cursor:
+            for label, columns in (
+                ('every column', ('slug', 'title', 'description', 'image', 'video_id', 'vi_sub', 'en_sub', 'vi_transcript', 'en_transcript')),
+                ('slug and title', ('slug', 'title')),
+            ):
+                cursor.execute('SELECT SUM(%s) FROM %s' % (
+                    ' + '.join('LENGTH(%s)' % column for column in columns), models.Video._meta.db_table))
+                self.stdout.write('%-20s %8.1f MB of text' % (label, cursor.fetchone()[0] / 1e6))
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ...exporter import export_catalog
+
+
+class Command(BaseCommand):
+    help = 'Writes every user, video and playlist as JSON lines, in the format import_catalog reads.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='File to write to instead of stdout.')
+        parser.add_argument('--chunk-size', type=int, default=settings.EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        if not options['output']:
+            for line in export_catalog(options['chunk_size']):
+                self.stdout.write(line, ending='')
+            return
+
+        amount = 0
+        with open(options['output'], 'w', encoding='utf-8') as f:
+            for line in export_catalog(options['chunk_size']):
+                f.write(line)
+                amount += 1
+
+        self.stdout.write(self.style.SUCCESS('%d records exported.' % amount))
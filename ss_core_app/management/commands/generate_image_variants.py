@@ -0,0 +1,100 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import F
+
+from ... import models
+from ...graphql.cache import invalidate
+from ...images import MAX_BATCH_SIZE, key_for_url, get_sizes, make_variants, record_variants
+
+# Every column holding an image URL
+IMAGE_FIELDS = (
+    (models.Video, 'image'),
+    (models.Speaker, 'image'),
+    (models.Source, 'image'),
+    (models.Category, 'image'),
+    (models.SubCategory, 'image'),
+    (models.Playlist, 'image'),
+    (models.Profile, 'avatar'),
+    (models.Profile, 'cover'),
+)
+
+
+class Command(BaseCommand):
+    help = 'Makes the sized variants of the images uploaded since the last run, or of every image with --all.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.IMAGE_WORKERS)
+        parser.add_argument('--all', action='store_true',
+            help='Also every image in use without all its variants, as uploaded before uploads were queued.')
+        parser.add_argument('--force', action='store_true', help='Make the variants of every image again.')
+        parser.add_argument('--watch', type=int, default=0, metavar='SECONDS',
+            help='Keep running, looking for new uploads this often.')
+
+    def handle(self, *args, **options):
+        while True:
+            self.generate(options['workers'], options['all'] or options['force'], options['force'])
+            if not options['watch']:
+                break
+            # Passes after the first only take new uploads.
+            options['all'] = options['force'] = False
+            connection.close()
+            time.sleep(options['watch'])
+
+    def get_keys(self, scan, force):
+        pending = models.PendingImage.objects.all()
+        if not scan:
+            pending = pending.filter(attempts__lt=settings.IMAGE_MAX_ATTEMPTS)
+        keys = set(pending.values_list('key', flat=True))
+        if not scan:
+            return keys
+
+        for model, field in IMAGE_FIELDS:
+            for url in model.objects.exclude(**{field: ''}).values_list(field, flat=True).distinct().iterator():
+                key = key_for_url(url)
+                if key is not None:
+                    keys.add(key)
+        if force:
+            return keys
+        return set(key for key, sizes in get_sizes(keys).items() if len(sizes) < len(settings.IMAGE_SIZES))
+
+    def generate(self, workers, scan, force):
+        keys = self.get_keys(scan, force)
+
+        def generate(key):
+            try:
+                return key, make_variants(key, force=force), None
+            except Exception as e:
+                return key, None, e
+
+        generated = 0
+        failed = []
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # The threads only work with the bucket; variants are recorded here.
+            for key, sizes, error in executor.map(generate, sorted(keys)):
+                if error is not None:
+                    failed.append(key)
+                    self.stderr.write(self.style.ERROR('%s: %s' % (key, error)))
+                    continue
+                found, made = sizes
+                record_variants(key, found + made)
+                if made:
+                    generated += 1
+                    self.stdout.write('%s: %s' % (key, ', '.join(made)))
+
+        done = sorted(keys.difference(failed))
+        for start in range(0, len(done), MAX_BATCH_SIZE):
+            models.PendingImage.objects.filter(key__in=done[start:start + MAX_BATCH_SIZE]).delete()
+        for start in range(0, len(failed), MAX_BATCH_SIZE):
+            models.PendingImage.objects\
+                .filter(key__in=failed[start:start + MAX_BATCH_SIZE])\
+                .update(attempts=F('attempts') + 1)
+
+        if generated:
+            # Responses cached with the original URLs may now use the variants.
+            invalidate(*set(model for model, field in IMAGE_FIELDS if model is not models.Profile), User)
+        self.stdout.write(self.style.SUCCESS('%d of %d images given variants, %d failed.' % (generated, len(keys), len(failed))))
@@ -0,0 +1,117 @@
+import json
+import os
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from ... import models
+from ...graphql.cache import invalidate
+from ...importer import import_videos, import_user, import_playlist
+
+IMPORTERS = {
+    'user': import_user,
+    'playlist': import_playlist,
+}
+
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return 0, 0
+    with open(path) as f:
+        checkpoint = json.load(f)
+    return checkpoint['offset'], checkpoint['line']
+
+
+def save_checkpoint(path, offset, line):
+    # Replaced atomically, so a crash leaves either the old or the new one.
+    with open(path + '.tmp', 'w') as f:
+        json.dump({'offset': offset, 'line': line}, f)
+    os.replace(path + '.tmp', path)
+
+
+class Command(BaseCommand):
+    help = 'Imports users, videos and playlists from a JSON lines file. Every line is an object with a ' \
+        '"type" of "user", "video" or "playlist" and the arguments of ImportUser, ImportVideo or ' \
+        'ImportPlaylist, in snake case. Records may refer to the ones on earlier lines.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--chunk-size', type=int, default=settings.IMPORT_CHUNK_SIZE, help='Records per transaction.')
+        parser.add_argument('--checkpoint', help='Where progress is saved to resume from. Defaults to PATH.checkpoint.')
+        parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint and start from the first line.')
+
+    def handle(self, *args, **options):
+        checkpoint = options['checkpoint'] or options['path'] + '.checkpoint'
+        offset, line = (0, 0) if options['restart'] else load_checkpoint(checkpoint)
+        if offset > os.path.getsize(options['path']):
+            raise CommandError("%s is shorter than its checkpoint, use --restart." % options['path'])
+        if offset:
+            self.stdout.write('Resuming from line %d.' % (line + 1))
+
+        self.imported = self.failed = 0
+        started = time.time()
+        kind, chunk = None, []
+
+        with open(options['path'], 'rb') as f:
+            f.seek(offset)
+            for raw in f:
+                line += 1
+                if raw.strip():
+                    try:
+                        record = json.loads(raw.decode('utf-8'))
+                        record_kind = record.pop('type')
+                        if record_kind != 'video' and record_kind not in IMPORTERS:
+                            raise Exception("Unknown type %r." % record_kind)
+                    except Exception as e:
+                        self.error(line, e)
+                    else:
+                        if chunk and (record_kind != kind or len(chunk) >= options['chunk_size']):
+                            self.write_chunk(kind, chunk)
+                            # Everything before this line is committed.
+                            save_checkpoint(checkpoint, offset, line - 1)
+                            self.report(line - 1, started)
+                            chunk = []
+                        kind = record_kind
+                        chunk.append((line, record))
+                offset += len(raw)
+
+        if chunk:
+            self.write_chunk(kind, chunk)
+            self.report(line, started)
+
+        invalidate(models.Video, models.Tag, models.Cue, models.Source, models.Speaker, models.Category, models.Playlist, User)
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+
+        self.stdout.write(self.style.SUCCESS('Catalog imported, %d failed.' % self.failed))
+
+    def write_chunk(self, kind, chunk):
+        if kind == 'video':
+            results = import_videos([record for line, record in chunk], len(chunk))
+            for (line, record), (video, errors) in zip(chunk, results):
+                if errors:
+                    self.error(line, errors)
+                else:
+                    self.imported += 1
+            return
+
+        with transaction.atomic():
+            for line, record in chunk:
+                try:
+                    with transaction.atomic():
+                        IMPORTERS[kind](record)
+                except Exception as e:
+                    self.error(line, e)
+                else:
+                    self.imported += 1
+
+    def error(self, line, e):
+        self.failed += 1
+        self.stderr.write(self.style.ERROR('line %d: %s' % (line, e)))
+
+    def report(self, line, started):
+        self.stdout.write('line %d: %d imported, %d failed, %.0f records/s' % (
+            line, self.imported, self.failed, (self.imported + self.failed) / max(time.time() - started, 0.001)))
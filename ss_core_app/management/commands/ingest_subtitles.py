@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from ... import models
+from ...graphql.cache import invalidate
+from ...subtitles import ingest_cues
+
+
+class Command(BaseCommand):
+    help = 'Parses the subtitle files of videos into timestamped, searchable cues.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('slugs', nargs='*', help='Only these videos.')
+        parser.add_argument('--missing', action='store_true',
+            help='Only new videos and videos whose subtitle files changed since.')
+        parser.add_argument('--watch', type=int, default=0, metavar='SECONDS',
+            help='Keep running, looking for missing videos this often.')
+
+    def handle(self, *args, **options):
+        while True:
+            self.ingest(options['slugs'], options['missing'])
+            if not options['watch']:
+                break
+            # Passes after the first only pick up what changed.
+            options['missing'] = True
+            connection.close()
+            time.sleep(options['watch'])
+
+    def ingest(self, slugs, missing):
+        videos = models.Video.objects.only('slug', 'vi_sub', 'en_sub').order_by('pk')
+        if slugs:
+            videos = videos.filter(slug__in=slugs)
+        if missing:
+            videos = videos.filter(cues_ingested=False)
+
+        ingested = failed = 0
+        for video in videos.iterator():
+            try:
+                amount = ingest_cues(video)
+            except Exception as e:
+                failed += 1
+                self.stderr.write(self.style.ERROR('%s: %s' % (video.slug, e)))
+                continue
+            if amount is None:
+                self.stdout.write('%s: replaced meanwhile, skipped' % video.slug)
+                continue
+            ingested += 1
+            self.stdout.write('%s: %d cues' % (video.slug, amount))
+
+        if ingested:
+            invalidate(models.Cue)
+        self.stdout.write(self.style.SUCCESS('Subtitles of %d videos ingested, %d failed.' % (ingested, failed)))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from ...search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text search index of every video, speaker and source.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rebuild_index(chunk_size=options['chunk_size'])
+
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt.'))
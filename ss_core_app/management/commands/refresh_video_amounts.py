@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ...counters import refresh_video_amounts
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the stored published video counters of sources, speakers, categories, playlists and profiles.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            refresh_video_amounts()
+
+        self.stdout.write(self.style.SUCCESS('Video amounts refreshed.'))
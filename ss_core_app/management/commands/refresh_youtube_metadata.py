@@ -0,0 +1,107 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+
+from ... import models, youtube
+from ...graphql.cache import invalidate
+from ...search import index_videos
+
+# Video fields that can be refreshed, and how to read them from an API item
+FIELDS = {
+    'duration': youtube.get_duration,
+    'title': lambda item: item['snippet']['title'],
+    'image': youtube.get_thumbnail,
+}
+
+# Videos per UPDATE, each binds three parameters and SQLite allows 999 by default
+UPDATE_BATCH_SIZE = 300
+
+
+def bulk_update(changes, field):
+    # An UPDATE per UPDATE_BATCH_SIZE videos in `changes` ({pk: {field: value}}) that
+    # change `field`. A raw CASE compiles much faster than one When() per video.
+    values = [(pk, changed[field]) for pk, changed in changes.items() if field in changed]
+    column = connection.ops.quote_name(models.Video._meta.get_field(field).column)
+    for start in range(0, len(values), UPDATE_BATCH_SIZE):
+        batch = values[start:start + UPDATE_BATCH_SIZE]
+        sql = 'CASE %s %s ELSE %s END' % (
+            connection.ops.quote_name(models.Video._meta.pk.column), ' '.join(['WHEN %s THEN %s'] * len(batch)), column)
+        params = [param for pk, value in batch for param in (pk, value)]
+        models.Video.objects.filter(pk__in=[pk for pk, value in batch]).update(**{field: RawSQL(sql, params)})
+
+
+class Command(BaseCommand):
+    help = 'Refreshes video metadata from the YouTube Data API, writing back only what changed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fields', default='duration',
+            help='Comma separated, of %s. Titles and images are often edited here, so only durations by default.'
+                % ', '.join(FIELDS))
+        parser.add_argument('--workers', type=int, default=4, help='API calls in flight at once.')
+        parser.add_argument('--budget', type=int, default=settings.YOUTUBE_DAILY_QUOTA,
+            help='Stop once the quota used today reaches this many units.')
+        parser.add_argument('--after', type=int, default=0, help='Only videos with a greater id, to resume a run.')
+
+    def handle(self, *args, **options):
+        fields = [field.strip() for field in options['fields'].split(',') if field.strip()]
+        for field in fields:
+            if field not in FIELDS:
+                raise CommandError("Unknown field %r." % field)
+
+        started = time.time()
+        last_pk = options['after']
+        checked = updated = missing = 0
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            while True:
+                calls = max(0, min(options['workers'], options['budget'] - youtube.quota_used()))
+                if not calls:
+                    self.stdout.write(self.style.WARNING('Quota budget reached, resume with --after %d.' % last_pk))
+                    break
+
+                videos = list(models.Video.objects
+                    .filter(pk__gt=last_pk)
+                    .order_by('pk')
+                    .values('pk', 'video_id', *fields)[:calls * youtube.BATCH_SIZE])
+                if not videos:
+                    break
+
+                ids = list(dict.fromkeys(video['video_id'] for video in videos))
+                items = {}
+                batches = [ids[start:start + youtube.BATCH_SIZE] for start in range(0, len(ids), youtube.BATCH_SIZE)]
+                # Counted here once for the round, the threads only make the calls.
+                youtube.spend_quota(len(batches))
+                for fetched in executor.map(youtube.request_videos, batches):
+                    items.update(fetched)
+
+                changes = {}
+                for video in videos:
+                    item = items.get(video['video_id'])
+                    if item is None:
+                        missing += 1
+                        continue
+                    changed = {field: FIELDS[field](item) for field in fields}
+                    # Empty values (no thumbnail, P0D of live streams) never overwrite.
+                    changed = {field: value for field, value in changed.items() if value and value != video[field]}
+                    if changed:
+                        changes[video['pk']] = changed
+
+                with transaction.atomic():
+                    for field in fields:
+                        bulk_update(changes, field)
+                    if 'title' in fields:
+                        index_videos([pk for pk, changed in changes.items() if 'title' in changed])
+
+                checked += len(videos)
+                updated += len(changes)
+                last_pk = videos[-1]['pk']
+                self.stdout.write('id %d: %d checked, %d updated, %d not on YouTube, %.0f videos/s' % (
+                    last_pk, checked, updated, missing, checked / max(time.time() - started, 0.001)))
+
+        if updated:
+            invalidate(models.Video)
+        self.stdout.write(self.style.SUCCESS('%d videos updated, %d quota units used today.' % (updated, youtube.quota_used())))
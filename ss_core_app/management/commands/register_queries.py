@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from ...graphql.persisted import register
+
+
+class Command(BaseCommand):
+    help = 'Registers GraphQL documents that clients may send by their sha256 hash.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='Files holding one GraphQL document each.')
+
+    def handle(self, *args, **options):
+        for path in options['paths']:
+            with open(path, encoding='utf-8') as document:
+                self.stdout.write('%s  %s' % (register(document.read()), path))
+
+        self.stdout.write(self.style.SUCCESS('Queries registered.'))
@@ -0,0 +1,67 @@
+# Generated by Django 2.1.4 on 2026-10-18 18:43
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_video_amounts(apps, schema_editor):
+    Video = apps.get_model('ss_core_app', 'Video')
+    counters = (
+        ('Source', 'video_amount', 'pk', Video, 'source', ''),
+        ('Speaker', 'video_amount', 'pk', apps.get_model('ss_core_app', 'VideoSpeaker'), 'speaker', 'video__'),
+        ('Category', 'video_amount', 'pk', apps.get_model('ss_core_app', 'VideoCategory'), 'category', 'video__'),
+        ('Playlist', 'video_amount', 'pk', apps.get_model('ss_core_app', 'PlaylistVideo'), 'playlist', 'video__'),
+        ('Profile', 'sponsored_video_amount', 'user', Video, 'sponsor', ''),
+        ('Profile', 'created_video_amount', 'user', Video, 'created_by', ''),
+    )
+
+    for model_name, field, key, through, target, video in counters:
+        published = through.objects\
+            .filter(**{target: OuterRef(key), video + 'is_published': True})\
+            .order_by()\
+            .values(target)\
+            .annotate(amount=Count('pk'))\
+            .values('amount')
+        apps.get_model('ss_core_app', model_name).objects.update(**{field: Coalesce(Subquery(published), 0)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ss_core_app', '0002_auto_20190311_1116'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='video_amount',
+            field=models.IntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='playlist',
+            name='video_amount',
+            field=models.IntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='created_video_amount',
+            field=models.IntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='sponsored_video_amount',
+            field=models.IntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='source',
+            name='video_amount',
+            field=models.IntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='speaker',
+            name='video_amount',
+            field=models.IntegerField(db_index=True, default=0),
+        ),
+        migrations.RunPython(populate_video_amounts, migrations.RunPython.noop),
+    ]
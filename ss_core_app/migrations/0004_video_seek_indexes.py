@@ -0,0 +1,29 @@
+# Generated by Django 2.1.4 on 2026-10-18 18:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ss_core_app', '0003_video_amount'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(fields=['published_at', 'id'], name='ss_core_app_publish_c127b3_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(fields=['view_amount', 'id'], name='ss_core_app_view_am_44275d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(fields=['duration', 'id'], name='ss_core_app_duratio_a64b67_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(fields=['title', 'id'], name='ss_core_app_title_0340c1_idx'),
+        ),
+    ]
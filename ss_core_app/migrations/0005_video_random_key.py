@@ -0,0 +1,39 @@
+# Generated by Django 2.1.4 on 2026-10-18 18:47
+
+import random
+
+from django.db import migrations, models
+from django.db.models import Case, When, Value, FloatField
+import ss_core_app.models
+
+
+def shuffle_random_keys(apps, schema_editor):
+    # AddField gives every existing row the same default; spread them out.
+    Video = apps.get_model('ss_core_app', 'Video')
+    ids = list(Video.objects.values_list('pk', flat=True))
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        Video.objects.filter(pk__in=chunk).update(random_key=Case(
+            *[When(pk=pk, then=Value(random.random())) for pk in chunk],
+            output_field=FloatField()
+        ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ss_core_app', '0004_video_seek_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='random_key',
+            field=models.FloatField(db_index=True, default=ss_core_app.models.random_key),
+        ),
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(fields=['is_published', 'random_key'], name='ss_core_app_is_publ_400ac2_idx'),
+        ),
+        migrations.RunPython(shuffle_random_keys, migrations.RunPython.noop),
+    ]
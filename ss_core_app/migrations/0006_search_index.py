@@ -0,0 +1,104 @@
+import re
+import unicodedata
+from collections import defaultdict
+
+from django.db import migrations
+
+# Frozen copies of what ss_core_app.search and utils did when this migration was
+# written, so that later changes there cannot break it. `manage.py
+# rebuild_search_index` rewrites the index the current way.
+INDEXES = (
+    ('ss_core_app_video_search', ('title', 'speakers', 'source', 'description'), (8, 4, 2, 1)),
+    ('ss_core_app_speaker_search', ('name', 'description'), (4, 1)),
+    ('ss_core_app_source_search', ('name', 'description'), (4, 1)),
+)
+VIDEO_INDEX, SPEAKER_INDEX, SOURCE_INDEX = INDEXES
+
+VIETNAMESE_LETTERS = {
+    'a': 'àáảãạăắằẵặẳâầấậẫẩ',
+    'd': 'đ',
+    'e': 'èéẻẽẹêềếểễệ',
+    'i': 'ìíỉĩị',
+    'o': 'òóỏõọôồốổỗộơờớởỡợ',
+    'u': 'ùúủũụưừứửữự',
+    'y': 'ỳýỷỹỵ',
+}
+FOLD_TABLE = {}
+for base, letters in VIETNAMESE_LETTERS.items():
+    for letter in letters:
+        FOLD_TABLE[ord(letter)] = base
+        FOLD_TABLE[ord(letter.upper())] = base.upper()
+
+WORD = re.compile(r'\w+')
+
+
+def fold(text):
+    return ' '.join(WORD.findall(unicodedata.normalize('NFC', text or '').translate(FOLD_TABLE).lower()))
+
+
+def create_index(cursor, index):
+    table, columns, weights = index
+    cursor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS %s USING fts5(%s, tokenize='unicode61', prefix='1 2 3', detail=column)"
+        % (table, ', '.join(columns))
+    )
+    cursor.execute(
+        "INSERT INTO %s(%s, rank) VALUES ('rank', 'bm25(%s)')"
+        % (table, table, ', '.join('%d.0' % weight for weight in weights))
+    )
+
+
+def drop_index(cursor, index):
+    cursor.execute("DROP TABLE IF EXISTS %s" % index[0])
+
+
+def write_rows(cursor, index, rows):
+    table, columns, weights = index
+    rows = [(row[0],) + tuple(fold(text) for text in row[1:]) for row in rows]
+    placeholders = '(%s)' % ', '.join(['%s'] * (len(columns) + 1))
+    size = 500 // (len(columns) + 1)
+    for start in range(0, len(rows), size):
+        chunk = rows[start:start + size]
+        cursor.execute(
+            "INSERT INTO %s(rowid, %s) VALUES %s" % (table, ', '.join(columns), ', '.join([placeholders] * len(chunk))),
+            [value for row in chunk for value in row]
+        )
+
+
+def create_search_index(apps, schema_editor):
+    Video = apps.get_model('ss_core_app', 'Video')
+    VideoSpeaker = apps.get_model('ss_core_app', 'VideoSpeaker')
+    Speaker = apps.get_model('ss_core_app', 'Speaker')
+    Source = apps.get_model('ss_core_app', 'Source')
+
+    with schema_editor.connection.cursor() as cursor:
+        for index in INDEXES:
+            create_index(cursor, index)
+
+        speakers = defaultdict(list)
+        for video_id, name in VideoSpeaker.objects.values_list('video', 'speaker__name'):
+            speakers[video_id].append(name)
+        write_rows(cursor, VIDEO_INDEX, [
+            (video_id, title, ' '.join(speakers[video_id]), source, description)
+            for video_id, title, source, description in Video.objects.values_list('pk', 'title', 'source__name', 'description')
+        ])
+        write_rows(cursor, SPEAKER_INDEX, Speaker.objects.values_list('pk', 'name', 'description'))
+        write_rows(cursor, SOURCE_INDEX, Source.objects.values_list('pk', 'name', 'description'))
+        cursor.execute("ANALYZE")
+
+
+def drop_search_index(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        for index in INDEXES:
+            drop_index(cursor, index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ss_core_app', '0005_video_random_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
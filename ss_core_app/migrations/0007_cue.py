@@ -0,0 +1,45 @@
+# Generated by Django 2.1.4 on 2026-10-18 19:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Inlined so that later changes to ss_core_app.search cannot break this migration.
+def create_cue_index(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS ss_core_app_cue_search "
+            "USING fts5(text, tokenize='unicode61', prefix='1 2 3', detail=column)"
+        )
+        cursor.execute("INSERT INTO ss_core_app_cue_search(ss_core_app_cue_search, rank) VALUES ('rank', 'bm25(1.0)')")
+
+
+def drop_cue_index(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("DROP TABLE IF EXISTS ss_core_app_cue_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ss_core_app', '0006_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Cue',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('language', models.CharField(choices=[('vi', 'Vietnamese'), ('en', 'English')], max_length=2)),
+                ('start', models.IntegerField()),
+                ('end', models.IntegerField()),
+                ('text', models.TextField()),
+                ('video', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='ss_core_app.Video')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='cue',
+            index=models.Index(fields=['video', 'language', 'start'], name='ss_core_app_video_i_af4633_idx'),
+        ),
+        migrations.RunPython(create_cue_index, drop_cue_index),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 2.1.4 on 2026-10-18 19:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ss_core_app', '0008_persisted_query'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageVariant',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255)),
+                ('size', models.CharField(max_length=16)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='imagevariant',
+            unique_together={('key', 'size')},
+        ),
+    ]
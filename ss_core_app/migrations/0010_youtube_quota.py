@@ -0,0 +1,21 @@
+# Generated by Django 2.1.4 on 2026-10-18 20:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ss_core_app', '0009_image_variant'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='YouTubeQuota',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+                ('units', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
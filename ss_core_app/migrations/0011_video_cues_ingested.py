@@ -0,0 +1,37 @@
+# Generated by Django 2.1.4 on 2026-10-18 20:13
+
+from django.db import migrations, models
+
+
+def mark_ingested(apps, schema_editor):
+    # Videos ingested before the field existed are the ones with cues.
+    Video = apps.get_model('ss_core_app', 'Video')
+    Cue = apps.get_model('ss_core_app', 'Cue')
+    Video.objects.filter(pk__in=Cue.objects.values('video')).update(cues_ingested=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ss_core_app', '0010_youtube_quota'),
+    ]
+
+    operations = [
+        # A plain ADD COLUMN, AddField copies the whole video table on SQLite.
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    'ALTER TABLE "ss_core_app_video" ADD COLUMN "cues_ingested" bool NOT NULL DEFAULT 0',
+                    migrations.RunSQL.noop,
+                ),
+            ],
+            state_operations=[
+                migrations.AddField(
+                    model_name='video',
+                    name='cues_ingested',
+                    field=models.BooleanField(default=False),
+                ),
+            ],
+        ),
+        migrations.RunPython(mark_ingested, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,14 @@
+import random
+
 from django.utils import timezone
 from django.db import models
 from django.contrib.auth.models import User
 
+
+def random_key():
+    return random.random()
+
+
 class Profile(models.Model):
     SPONSOR = 'SP'
     MEMBER = 'ME'
@@ -37,6 +44,8 @@ class Profile(models.Model):
     website = models.CharField(max_length=255, blank=True)
     facebook = models.CharField(max_length=255, blank=True)
     role = models.CharField(max_length=255, choices=ROLE_CHOICES, default='MB')
+    sponsored_video_amount = models.IntegerField(default=0, db_index=True)
+    created_video_amount = models.IntegerField(default=0, db_index=True)
 
     def __str__(self):
         return self.user.username
@@ -57,6 +66,7 @@ class Source(models.Model):
     name = models.CharField(max_length=255)
     image = models.CharField(max_length=255)
     description = models.TextField(blank=True)
+    video_amount = models.IntegerField(default=0, db_index=True)
 
     def __str__(self):
         return self.name
@@ -90,15 +100,32 @@ class Video(models.Model):
 
     is_published = models.BooleanField(default=False)
 
+    # Stable random position, so random ordering is an index range scan.
+    random_key = models.FloatField(default=random_key, db_index=True)
+
+    # Whether the cues of the current subtitle files are stored, see subtitles.py.
+    cues_ingested = models.BooleanField(default=False)
+
     def __str__(self):
         return self.title
 
+    class Meta:
+        # Seek pagination ranges over (ordering column, id).
+        indexes = [
+            models.Index(fields=['published_at', 'id']),
+            models.Index(fields=['view_amount', 'id']),
+            models.Index(fields=['duration', 'id']),
+            models.Index(fields=['title', 'id']),
+            models.Index(fields=['is_published', 'random_key']),
+        ]
+
 
 class Speaker(models.Model):
     slug = models.CharField(max_length=255, unique=True)
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True)
     image = models.CharField(max_length=255)
+    video_amount = models.IntegerField(default=0, db_index=True)
 
     def __str__(self):
         return self.name
@@ -121,6 +148,7 @@ class Category(models.Model):
     description = models.TextField(blank=True)
     image = models.CharField(max_length=255)
     priority = models.IntegerField(default=1)
+    video_amount = models.IntegerField(default=0, db_index=True)
 
     def __str__(self):
         return self.name
@@ -183,6 +211,7 @@ class Playlist(models.Model):
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True)
     image = models.CharField(max_length=255)
+    video_amount = models.IntegerField(default=0, db_index=True)
 
     def __str__(self):
         return self.name
@@ -198,3 +227,69 @@ class PlaylistVideo(models.Model):
 
     class Meta:
         unique_together = (('playlist', 'video'),)
+
+
+class Cue(models.Model):
+    VI = 'vi'
+    EN = 'en'
+
+    LANGUAGES = (
+        (VI, 'Vietnamese'),
+        (EN, 'English'),
+    )
+
+    video = models.ForeignKey(Video, on_delete=models.CASCADE)
+    language = models.CharField(max_length=2, choices=LANGUAGES)
+    # Milliseconds from the start of the video
+    start = models.IntegerField()
+    end = models.IntegerField()
+    text = models.TextField()
+
+    def __str__(self):
+        return self.text
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['video', 'language', 'start']),
+        ]
+
+
+class PersistedQuery(models.Model):
+    # GraphQL documents clients may send by their sha256 hash alone.
+    hash = models.CharField(max_length=64, unique=True)
+    query = models.TextField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return self.hash
+
+
+class ImageVariant(models.Model):
+    # A sized copy of an uploaded image that exists in the bucket, see images.py.
+    key = models.CharField(max_length=255)
+    size = models.CharField(max_length=16)
+
+    def __str__(self):
+        return '%s %s' % (self.key, self.size)
+
+    class Meta:
+        unique_together = (('key', 'size'),)
+
+
+class PendingImage(models.Model):
+    # An uploaded image generate_image_variants has still to make variants of.
+    key = models.CharField(max_length=255, unique=True)
+    attempts = models.IntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return self.key
+
+
+class YouTubeQuota(models.Model):
+    # Data API units spent on a day, Pacific time, by every process.
+    day = models.DateField(unique=True)
+    units = models.IntegerField(default=0)
+
+    def __str__(self):
+        return '%s %d' % (self.day, self.units)
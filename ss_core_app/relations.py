@@ -0,0 +1,92 @@
+import json
+
+from . import models
+from .utils import name_to_slug
+
+
+def field_error(field, message, code):
+    # Same shape as form.errors.as_json(), which the clients already handle.
+    return Exception(json.dumps({field: [{"message": message, "code": code}]}))
+
+
+def unique(values):
+    seen = set()
+    return [value for value in values if not (value in seen or seen.add(value))]
+
+
+def to_id(value):
+    # The id in `value`, or None. isdecimal(), as isdigit() also takes superscripts
+    # that int() rejects, and no id is past the 64 bits SQLite can bind.
+    if value.isdecimal() and int(value) < 2 ** 63:
+        return int(value)
+    return None
+
+
+def get_target_ids(model, field, ids):
+    # Checks that every id in `ids` exists with one query, and returns them as
+    # integers, in order and without duplicates.
+    ids = unique(to_id(str(target_id).strip()) for target_id in ids)
+    found = model.objects.only('pk').in_bulk([target_id for target_id in ids if target_id is not None])
+    for target_id in ids:
+        if target_id not in found:
+            raise field_error(field, "Select a valid choice. That choice is not one of the available choices.", "invalid_choice")
+    return ids
+
+
+def get_tag_slugs(tags):
+    slugs = unique(name_to_slug(tag) for tag in tags)
+    max_length = models.Tag._meta.get_field('slug').max_length
+    for slug in slugs:
+        if not slug:
+            raise field_error('slug', "This field is required.", "required")
+        if len(slug) > max_length:
+            raise field_error(
+                'slug',
+                "Ensure this value has at most %d characters (it has %d)." % (max_length, len(slug)),
+                "max_length"
+            )
+    return slugs
+
+
+def diff_related(through, field, values):
+    # What makes the `through` rows of each video in `values` ({video id: values of
+    # `field`}) hold exactly those values: ({pk: video id} of stale rows, missing
+    # rows). Rows that already match are left untouched.
+    attname = through._meta.get_field(field).attname
+    current = {}
+    stale = {}
+    for pk, video_id, value in through.objects.filter(video__in=list(values)).values_list('pk', 'video', field):
+        if value in values[video_id]:
+            current.setdefault(video_id, set()).add(value)
+        else:
+            stale[pk] = video_id
+
+    missing = [
+        through(video_id=video_id, **{attname: value})
+        for video_id, targets in values.items()
+        for value in targets if value not in current.get(video_id, ())
+    ]
+    return stale, missing
+
+
+def write_related(through, stale, missing):
+    if stale:
+        through.objects.filter(pk__in=list(stale)).delete()
+    through.objects.bulk_create(missing)
+
+
+def set_related(video, through, field, values):
+    write_related(through, *diff_related(through, field, {video.pk: values}))
+
+
+def set_video_relations(video, speaker_ids, category_ids, subcategory_ids, tags):
+    # Everything is validated before anything is written.
+    speaker_ids = get_target_ids(models.Speaker, 'speaker', speaker_ids)
+    category_ids = get_target_ids(models.Category, 'category', category_ids)
+    subcategory_ids = get_target_ids(models.SubCategory, 'subcategory', subcategory_ids)
+    slugs = get_tag_slugs(tags)
+
+    set_related(video, models.VideoSpeaker, 'speaker', speaker_ids)
+    set_related(video, models.VideoCategory, 'category', category_ids)
+    set_related(video, models.VideoSubCategory, 'subcategory', subcategory_ids)
+    set_related(video, models.Tag, 'slug', slugs)
@@ -0,0 +1,222 @@
+from collections import defaultdict, namedtuple
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import BooleanField, IntegerField
+from django.db.models.expressions import RawSQL
+
+from . import models
+from .utils import convert
+
+# FTS5 tables keyed by the primary key of the indexed object, holding text folded
+# like slugs so that "Tiếng Việt" and "tieng viet" share terms. Columns and bm25
+# weights go in the same order.
+SearchIndex = namedtuple('SearchIndex', 'table columns weights')
+
+VIDEO_INDEX = SearchIndex('ss_core_app_video_search', ('title', 'speakers', 'source', 'description'), (8, 4, 2, 1))
+SPEAKER_INDEX = SearchIndex('ss_core_app_speaker_search', ('name', 'description'), (4, 1))
+SOURCE_INDEX = SearchIndex('ss_core_app_source_search', ('name', 'description'), (4, 1))
+
+INDEXES = (VIDEO_INDEX, SPEAKER_INDEX, SOURCE_INDEX)
+
+# Subtitle cues, keyed by cue id.
+CUE_INDEX = SearchIndex('ss_core_app_cue_search', ('text',), (1,))
+
+WORD = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return WORD.findall(convert(text or '').lower())
+
+
+def fold(text):
+    return ' '.join(tokenize(text))
+
+
+def create_index(cursor, index):
+    # Prefix indexes keep short "as you type" prefixes from expanding over the whole vocabulary.
+    cursor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS %s USING fts5(%s, tokenize='unicode61', prefix='1 2 3', detail=column)"
+        % (index.table, ', '.join(index.columns))
+    )
+    cursor.execute(
+        "INSERT INTO %s(%s, rank) VALUES ('rank', 'bm25(%s)')"
+        % (index.table, index.table, ', '.join('%d.0' % weight for weight in index.weights))
+    )
+
+
+def drop_index(cursor, index):
+    cursor.execute("DROP TABLE IF EXISTS %s" % index.table)
+
+
+def analyze(cursor):
+    # Without statistics SQLite drives `pk IN (results)` from any equality index, such
+    # as is_published, and sorts the whole catalog instead of looking up the results.
+    cursor.execute("ANALYZE")
+
+
+def write_rows(cursor, index, object_ids, rows):
+    # Replaces the documents of `object_ids` by `rows`, tuples of the object id and
+    # the raw text of each column.
+    object_ids = list(object_ids)
+    for start in range(0, len(object_ids), 500):
+        chunk = object_ids[start:start + 500]
+        cursor.execute(
+            "DELETE FROM %s WHERE rowid IN (%s)" % (index.table, ', '.join(['%s'] * len(chunk))),
+            chunk
+        )
+    # Multi-row INSERTs of at most 500 parameters, the lowest SQLite limit being 999.
+    rows = [(row[0],) + tuple(fold(text) for text in row[1:]) for row in rows]
+    placeholders = '(%s)' % ', '.join(['%s'] * (len(index.columns) + 1))
+    size = 500 // (len(index.columns) + 1)
+    for start in range(0, len(rows), size):
+        chunk = rows[start:start + size]
+        cursor.execute(
+            "INSERT INTO %s(rowid, %s) VALUES %s"
+            % (index.table, ', '.join(index.columns), ', '.join([placeholders] * len(chunk))),
+            [value for row in chunk for value in row]
+        )
+
+
+def index_videos(video_ids):
+    video_ids = list(video_ids)
+    speakers = defaultdict(list)
+    for video_id, name in models.VideoSpeaker.objects\
+            .filter(video__in=video_ids)\
+            .values_list('video', 'speaker__name'):
+        speakers[video_id].append(name)
+
+    rows = [
+        (video_id, title, ' '.join(speakers[video_id]), source, description)
+        for video_id, title, source, description in models.Video.objects
+            .filter(pk__in=video_ids)
+            .values_list('pk', 'title', 'source__name', 'description')
+    ]
+
+    with connection.cursor() as cursor:
+        write_rows(cursor, VIDEO_INDEX, video_ids, rows)
+
+
+def index_speakers(speaker_ids, with_videos=True):
+    speaker_ids = list(speaker_ids)
+    with connection.cursor() as cursor:
+        write_rows(cursor, SPEAKER_INDEX, speaker_ids, models.Speaker.objects
+            .filter(pk__in=speaker_ids)
+            .values_list('pk', 'name', 'description'))
+
+    # Speaker names are part of the documents of their videos.
+    if with_videos:
+        index_videos(models.VideoSpeaker.objects.filter(speaker__in=speaker_ids).values_list('video', flat=True))
+
+
+def index_sources(source_ids, with_videos=True):
+    source_ids = list(source_ids)
+    with connection.cursor() as cursor:
+        write_rows(cursor, SOURCE_INDEX, source_ids, models.Source.objects
+            .filter(pk__in=source_ids)
+            .values_list('pk', 'name', 'description'))
+
+    if with_videos:
+        index_videos(models.Video.objects.filter(source__in=source_ids).values_list('pk', flat=True))
+
+
+def index_cues(cue_ids):
+    cue_ids = list(cue_ids)
+    with connection.cursor() as cursor:
+        write_rows(cursor, CUE_INDEX, cue_ids, models.Cue.objects
+            .filter(pk__in=cue_ids)
+            .values_list('pk', 'text'))
+
+
+def rebuild_index(chunk_size=1000):
+    with connection.cursor() as cursor:
+        for index in INDEXES + (CUE_INDEX,):
+            drop_index(cursor, index)
+            create_index(cursor, index)
+
+    indexes = (
+        (models.Video, index_videos),
+        (models.Speaker, lambda ids: index_speakers(ids, with_videos=False)),
+        (models.Source, lambda ids: index_sources(ids, with_videos=False)),
+        (models.Cue, index_cues),
+    )
+    for model, index in indexes:
+        ids = list(model.objects.values_list('pk', flat=True))
+        for start in range(0, len(ids), chunk_size):
+            index(ids[start:start + chunk_size])
+
+    with connection.cursor() as cursor:
+        analyze(cursor)
+
+
+def match_query(query):
+    # The FTS5 query matching every term of `query`, the last one also as a prefix.
+    # None when there are no terms.
+    tokens = tokenize(query)
+    if not tokens:
+        return None
+    return ' '.join('"%s"' % token for token in tokens) + '*'
+
+
+def match_sql(index):
+    return "SELECT rowid FROM {table} WHERE {table} MATCH %s".format(table=index.table)
+
+
+def search(index, query, limit=None, within=None):
+    # Ids of the objects matching every query term, best first, at most `limit` or
+    # SEARCH_RESULT_LIMIT of them. `within`, a queryset of the indexed objects,
+    # restricts the matches before they are ranked and cut to the limit. None when
+    # the query has no terms.
+    match = match_query(query)
+    if match is None:
+        return None
+
+    sql = match_sql(index)
+    params = [match]
+    if within is not None:
+        subquery, subquery_params = within.order_by().values('pk').query.sql_with_params()
+        # The unary + keeps the constraint from the FTS table, which would otherwise
+        # run the MATCH again for every id of the subquery.
+        sql += " AND +rowid IN (" + subquery + ")"
+        params.extend(subquery_params)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql + " ORDER BY rank LIMIT %s", params + [limit or settings.SEARCH_RESULT_LIMIT])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def filter_by_search(queryset, index, query):
+    # Restricts `queryset` to every object matching `query`. The SEARCH_RESULT_LIMIT
+    # best ranked come first, annotated with a positive `search_rank`; the other
+    # matches follow, with a rank of 0, in the order of `queryset`. Later order_by()
+    # calls still take precedence.
+    results = search(index, query, within=queryset)
+    if results is None:
+        return queryset
+    if not results:
+        return queryset.none()
+
+    # Ids are integers read from the index, written in the SQL: a raw CASE compiles
+    # faster than When() expressions, and parameters would be limited to 999.
+    opts = queryset.model._meta
+    rank = RawSQL(
+        '(CASE "%s"."%s" %s ELSE 0 END)' % (opts.db_table, opts.pk.column, ' '.join(
+            'WHEN %d THEN %d' % (int(object_id), len(results) - idx) for idx, object_id in enumerate(results))),
+        [],
+        output_field=IntegerField()
+    )
+
+    # A boolean annotation as Django wraps a raw `pk__in` subquery in a second pair
+    # of parentheses, which makes it a scalar to SQLite.
+    matches = RawSQL(
+        '"%s"."%s" IN (%s)' % (opts.db_table, opts.pk.column, match_sql(index)),
+        [match_query(query)],
+        output_field=BooleanField()
+    )
+
+    return queryset\
+        .annotate(search_match=matches)\
+        .filter(search_match=True)\
+        .annotate(search_rank=rank)\
+        .order_by('-search_rank', *(queryset.query.order_by or opts.ordering))
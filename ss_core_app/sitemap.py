@@ -0,0 +1,165 @@
+import zlib
+from collections import OrderedDict
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Max, Q
+from django.utils import timezone
+from django.utils.encoding import iri_to_uri
+
+from . import models
+
+KEY_PREFIX = 'sitemap:'
+INDEX_KEY = KEY_PREFIX + 'index'
+
+HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+URLSET = '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+SITEMAPINDEX = '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+
+
+class Section:
+    # Rows of one kind, listed in files of SITEMAP_SHARD_SIZE consecutive ids so
+    # that a changed row only expires the file it is in. `dates` are the fields,
+    # maybe across relations, whose latest value is the lastmod of a row.
+    def __init__(self, name, get_queryset, dates, date_filter=None):
+        self.name = name
+        self.get_queryset = get_queryset
+        self.dates = dates
+        self.date_filter = date_filter
+
+    def lastmods(self):
+        return {
+            'lastmod_%d' % idx: Max(date, filter=self.date_filter)
+            for idx, date in enumerate(self.dates)
+        }
+
+    def shards(self):
+        # [(number, lastmod)] of the files with at least one row, in one grouped query.
+        size = settings.SITEMAP_SHARD_SIZE
+        shards = self.get_queryset()\
+            .annotate(shard=F('pk') / size)\
+            .order_by('shard')\
+            .values('shard')\
+            .annotate(**self.lastmods())
+        return [(shard.pop('shard'), latest(shard.values())) for shard in shards]
+
+    def has_shard(self, number):
+        # Whether file `number` is one of shards(), without grouping every row.
+        size = settings.SITEMAP_SHARD_SIZE
+        return self.get_queryset().filter(pk__gte=number * size, pk__lt=(number + 1) * size).exists()
+
+    def urls(self, number):
+        # (path, lastmod) of the rows of file `number`, read a chunk at a time.
+        size = settings.SITEMAP_SHARD_SIZE
+        rows = self.get_queryset()\
+            .filter(pk__gte=number * size, pk__lt=(number + 1) * size)\
+            .order_by('pk')\
+            .values_list('slug')\
+            .annotate(**self.lastmods())
+        path = settings.SITEMAP_PATHS[self.name]
+        for row in rows.iterator(chunk_size=2000):
+            yield path % row[0], latest(row[1:])
+
+
+SECTIONS = OrderedDict((section.name, section) for section in (
+    Section('videos', lambda: models.Video.objects.filter(is_published=True), ('published_at', 'updated_at')),
+    Section('speakers', lambda: models.Speaker.objects.filter(video_amount__gt=0),
+        ('videospeaker__video__published_at',), Q(videospeaker__video__is_published=True)),
+    Section('sources', lambda: models.Source.objects.filter(video_amount__gt=0),
+        ('video__published_at',), Q(video__is_published=True)),
+    Section('categories', lambda: models.Category.objects.filter(video_amount__gt=0),
+        ('videocategory__video__published_at',), Q(videocategory__video__is_published=True)),
+    Section('playlists', lambda: models.Playlist.objects.filter(video_amount__gt=0),
+        ('playlistvideo__video__published_at',), Q(playlistvideo__video__is_published=True)),
+))
+
+
+def latest(dates):
+    dates = [date for date in dates if date is not None]
+    return max(dates) if dates else None
+
+
+def shard_key(section, number):
+    return '%s%s:%d' % (KEY_PREFIX, section, number)
+
+
+def absolute_url(path):
+    return escape(iri_to_uri(settings.SITE_URL.rstrip('/') + path))
+
+
+def entry(tag, path, lastmod):
+    if lastmod is None:
+        return '<%s><loc>%s</loc></%s>\n' % (tag, absolute_url(path), tag)
+    return '<%s><loc>%s</loc><lastmod>%s</lastmod></%s>\n' % (
+        tag, absolute_url(path), timezone.localtime(lastmod, timezone.utc).isoformat(timespec='seconds'), tag)
+
+
+def cached(key, generate):
+    # Streams what `generate` yields and caches it once complete. Both ways it is
+    # only held compressed: XML of 50,000 URLs takes about 7 MB, a small fraction
+    # of that zipped.
+    content = cache.get(key)
+    if content is not None:
+        decompressor = zlib.decompressobj()
+        for start in range(0, len(content), 16 * 1024):
+            yield decompressor.decompress(content[start:start + 16 * 1024])
+        yield decompressor.flush()
+        return
+
+    compressor = zlib.compressobj()
+    parts = []
+    for part in generate():
+        parts.append(compressor.compress(part.encode('utf-8')))
+        yield part
+    parts.append(compressor.flush())
+    cache.set(key, b''.join(parts), settings.SITEMAP_CACHE_TIMEOUT)
+
+
+def generate_index():
+    yield HEADER + SITEMAPINDEX
+    yield entry('sitemap', '/sitemap-pages.xml', None)
+    for name, section in SECTIONS.items():
+        for number, lastmod in section.shards():
+            yield entry('sitemap', '/sitemap-%s-%d.xml' % (name, number), lastmod)
+    yield '</sitemapindex>\n'
+
+
+def generate_shard(section, number):
+    yield HEADER + URLSET
+    batch = []
+    for path, lastmod in section.urls(number):
+        batch.append(entry('url', path, lastmod))
+        if len(batch) == 1000:
+            yield ''.join(batch)
+            batch = []
+    yield ''.join(batch) + '</urlset>\n'
+
+
+def render_index():
+    return cached(INDEX_KEY, generate_index)
+
+
+def render_pages():
+    return [HEADER + URLSET] + [entry('url', path, None) for path in settings.SITEMAP_PAGES] + ['</urlset>\n']
+
+
+def render_shard(name, number):
+    # None for an unknown section or a file with no rows, which is not in the index
+    # and must not be cached empty.
+    section = SECTIONS.get(name)
+    if section is None or not section.has_shard(number):
+        return None
+    return cached(shard_key(name, number), lambda: generate_shard(section, number))
+
+
+def invalidate(video_ids):
+    # Expires the index and the files listing `video_ids` once the current
+    # transaction commits; they are generated again when next requested. The
+    # other sections follow within SITEMAP_CACHE_TIMEOUT.
+    keys = [INDEX_KEY] + [
+        shard_key('videos', number)
+        for number in set(int(video_id) // settings.SITEMAP_SHARD_SIZE for video_id in video_ids)
+    ]
+    transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,202 @@
+import io
+import os
+import threading
+import uuid
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+from django.conf import settings
+from django.core import signing
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopFutureHandlers
+
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=settings.AWS_MULTIPART_CHUNKSIZE,
+    multipart_chunksize=settings.AWS_MULTIPART_CHUNKSIZE,
+    max_concurrency=settings.AWS_MAX_CONCURRENCY,
+)
+
+lock = threading.Lock()
+client = None
+client_pid = None
+
+
+def get_client():
+    # Clients are thread-safe, but creating one resolves credentials and endpoints
+    # and is not, so each process creates one, once.
+    global client, client_pid
+    if client_pid != os.getpid():
+        with lock:
+            if client_pid != os.getpid():
+                client = boto3.session.Session().client(
+                    's3',
+                    aws_access_key_id=settings.AWS_ACCESS_KEY,
+                    aws_secret_access_key=settings.AWS_SECRET_KEY,
+                    region_name=settings.AWS_REGION,
+                    endpoint_url=settings.AWS_ENDPOINT_URL or None,
+                    config=Config(signature_version='s3v4', max_pool_connections=settings.AWS_MAX_CONCURRENCY * 4),
+                )
+                client_pid = os.getpid()
+    return client
+
+
+def public_url(key):
+    return os.path.join(settings.AWS_HOST, settings.AWS_BUCKET, key)
+
+
+def unique_key(folder, file_name):
+    return os.path.join(folder, "%s.%s" % (str(uuid.uuid4()), str(file_name).split(".")[-1]))
+
+
+def upload_args(file_name, username):
+    return {
+        'ACL': 'public-read',
+        "Metadata": {
+            "uploader": username
+        },
+        'ContentType': 'text/plain' if str(file_name).split(".")[-1] == 'srt' else 'image/jpeg',
+    }
+
+
+def presign_upload(folder, file_name, username):
+    # A presigned POST that lets the client upload one file straight to S3 at a
+    # key chosen here, and a token to confirm it with afterwards.
+    key = unique_key(folder, file_name)
+    extra_args = upload_args(file_name, username)
+    fields = {
+        'acl': extra_args['ACL'],
+        'Content-Type': extra_args['ContentType'],
+        'x-amz-meta-uploader': username,
+    }
+    post = get_client().generate_presigned_post(
+        Bucket=settings.AWS_BUCKET,
+        Key=key,
+        Fields=fields,
+        Conditions=[{name: value} for name, value in fields.items()] + [
+            ['content-length-range', 1, settings.AWS_UPLOAD_MAX_SIZE],
+        ],
+        ExpiresIn=settings.AWS_UPLOAD_EXPIRES,
+    )
+    token = signing.dumps({'key': key, 'uploader': username}, salt='storage.upload')
+    return key, post, token
+
+
+def confirm_upload(token, username):
+    # The key of a presigned upload once its file is in the bucket.
+    try:
+        upload = signing.loads(token, salt='storage.upload', max_age=settings.AWS_UPLOAD_EXPIRES * 2)
+    except signing.BadSignature:
+        raise Exception("Invalid upload token.")
+    if upload['uploader'] != username:
+        raise Exception("Invalid upload token.")
+
+    try:
+        get_client().head_object(Bucket=settings.AWS_BUCKET, Key=upload['key'])
+    except ClientError:
+        raise Exception("The file has not been uploaded.")
+    return upload['key']
+
+
+def upload(fileobj, key, extra_args):
+    get_client().upload_fileobj(fileobj, settings.AWS_BUCKET, key, ExtraArgs=extra_args, Config=TRANSFER_CONFIG)
+
+
+def move(key, new_key):
+    # Server side, no data goes through here.
+    get_client().copy_object(
+        Bucket=settings.AWS_BUCKET,
+        Key=new_key,
+        CopySource={'Bucket': settings.AWS_BUCKET, 'Key': key},
+        ACL='public-read',
+        MetadataDirective='COPY',
+    )
+    get_client().delete_object(Bucket=settings.AWS_BUCKET, Key=key)
+
+
+class S3File(UploadedFile):
+    # An uploaded file that is already stored at `key`.
+    def __init__(self, key, name, content_type, size, charset, content_type_extra):
+        super(S3File, self).__init__(None, name, content_type, size, charset, content_type_extra)
+        self.key = key
+
+
+class S3UploadHandler(FileUploadHandler):
+    # Streams the file of `field_name` to S3 while the request body is read: a file
+    # larger than AWS_MULTIPART_CHUNKSIZE goes up one part at a time, so no more
+    # than one part is ever held and nothing is written to a temporary file.
+    # Insert it first in request.upload_handlers before the body is read. Files
+    # with one of `local_extensions` are left to the next handlers.
+    def __init__(self, request, field_name, folder, username, local_extensions=()):
+        super(S3UploadHandler, self).__init__(request)
+        self.field_name = field_name
+        self.local_extensions = local_extensions
+        self.folder = folder
+        self.username = username
+        self.active = False
+        self.upload_id = None
+
+    def new_file(self, field_name, file_name, *args, **kwargs):
+        super(S3UploadHandler, self).new_file(field_name, file_name, *args, **kwargs)
+        self.active = field_name == self.field_name and \
+            os.path.splitext(file_name)[1].lower() not in self.local_extensions
+        if not self.active:
+            return
+
+        self.key = unique_key(self.folder, file_name)
+        self.extra_args = upload_args(file_name, self.username)
+        self.buffer = io.BytesIO()
+        self.parts = []
+        raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.active:
+            return raw_data
+
+        self.buffer.write(raw_data)
+        if self.buffer.tell() >= settings.AWS_MULTIPART_CHUNKSIZE:
+            self.upload_part()
+
+    def upload_part(self):
+        if self.upload_id is None:
+            self.upload_id = get_client().create_multipart_upload(
+                Bucket=settings.AWS_BUCKET, Key=self.key, **self.extra_args
+            )['UploadId']
+
+        response = get_client().upload_part(
+            Bucket=settings.AWS_BUCKET,
+            Key=self.key,
+            UploadId=self.upload_id,
+            PartNumber=len(self.parts) + 1,
+            Body=self.buffer.getvalue(),
+        )
+        self.parts.append({'PartNumber': len(self.parts) + 1, 'ETag': response['ETag']})
+        self.buffer = io.BytesIO()
+
+    def file_complete(self, file_size):
+        if not self.active:
+            return None
+        self.active = False
+
+        if self.upload_id is None:
+            get_client().put_object(Bucket=settings.AWS_BUCKET, Key=self.key, Body=self.buffer.getvalue(), **self.extra_args)
+        else:
+            if self.buffer.tell():
+                self.upload_part()
+            get_client().complete_multipart_upload(
+                Bucket=settings.AWS_BUCKET,
+                Key=self.key,
+                UploadId=self.upload_id,
+                MultipartUpload={'Parts': self.parts},
+            )
+            self.upload_id = None
+
+        return S3File(self.key, self.file_name, self.content_type, file_size, self.charset, self.content_type_extra)
+
+    def abort(self):
+        # Drops the parts of an upload the request broke off.
+        if self.upload_id is not None:
+            get_client().abort_multipart_upload(Bucket=settings.AWS_BUCKET, Key=self.key, UploadId=self.upload_id)
+            self.upload_id = None
@@ -0,0 +1,304 @@
+import codecs
+import io
+import json
+import re
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+import requests
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from . import models, storage
+from .search import CUE_INDEX, index_cues, search
+
+PAIRS_PREFIX = 'subtitles:pairs:'
+
+TIMING = re.compile(
+    r'(\d+):(\d{1,2}):(\d{1,2})[,.](\d{1,3})\s*-->\s*(\d+):(\d{1,2}):(\d{1,2})[,.](\d{1,3})'
+)
+# Inline formatting: <i>, <font color=...>, {\an8}
+TAG = re.compile(r'<[^>]*>|\{\\[^}]*\}')
+
+
+def to_milliseconds(hours, minutes, seconds, fraction):
+    return ((int(hours) * 60 + int(minutes)) * 60 + int(seconds)) * 1000 + int(fraction.ljust(3, '0'))
+
+
+def iter_cues(lines, errors=None):
+    # Streams (start, end, text) out of the lines of an SRT file in one pass, with
+    # times in milliseconds. Blocks without a timing line in their first two lines
+    # are skipped rather than failing the whole file; when `errors` is a list,
+    # they and impossible timings are added to it as (line number, message).
+    header = 0
+    timing = None
+    body = []
+    for number, line in enumerate(lines, 1):
+        line = line.rstrip()
+        if not line:
+            if timing is not None:
+                text = TAG.sub('', '\n'.join(body)).strip()
+                if text:
+                    yield timing[0], timing[1], text
+            header, timing, body = 0, None, []
+        elif timing is not None:
+            body.append(line)
+        elif header < 2:
+            match = TIMING.search(line)
+            if match is None:
+                header += 1
+                # The timing line follows the cue number, which some editors leave out.
+                if header == 2 and errors is not None:
+                    errors.append((number, "Expected a timing line like 00:00:01,000 --> 00:00:02,000."))
+                continue
+
+            groups = match.groups()
+            timing = (to_milliseconds(*groups[:4]), to_milliseconds(*groups[4:]))
+            if errors is not None:
+                if any(int(value) > 59 for value in groups[1:3] + groups[5:7]):
+                    errors.append((number, "Minutes and seconds must be below 60."))
+                elif timing[1] < timing[0]:
+                    errors.append((number, "The cue ends before it starts."))
+
+    if timing is not None:
+        text = TAG.sub('', '\n'.join(body)).strip()
+        if text:
+            yield timing[0], timing[1], text
+
+
+def parse_srt(text):
+    # [(start, end, text)] of the whole text of an SRT file.
+    return list(iter_cues(text.lstrip('\ufeff').splitlines()))
+
+
+def read_lines(fileobj, chunk_size=64 * 1024):
+    # The lines of a file object of UTF-8 bytes, decoded a chunk at a time. The last
+    # line of a chunk is held back, as it may go on, or end in half a \r\n.
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    rest = ''
+    for chunk in iter(lambda: fileobj.read(chunk_size), b''):
+        lines = (rest + decoder.decode(chunk)).splitlines(True)
+        rest = lines.pop() if lines else ''
+        yield from lines
+    rest += decoder.decode(b'', final=True)
+    if rest:
+        yield rest
+
+
+def read_srt(fileobj):
+    # (cues, errors) of an SRT file object of UTF-8 bytes, streamed.
+    errors = []
+    try:
+        cues = list(iter_cues(read_lines(fileobj), errors))
+    except UnicodeDecodeError:
+        return [], [(None, "The file is not UTF-8 text.")]
+    if not cues and not errors:
+        errors.append((None, "The file has no cues."))
+    return cues, errors
+
+
+def format_errors(errors):
+    return '\n'.join(
+        ('line %d: %s' % (number, message)) if number else message
+        for number, message in errors[:10]
+    )
+
+
+def vtt_timestamp(milliseconds):
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return '%02d:%02d:%02d.%03d' % (hours, minutes, seconds, milliseconds)
+
+
+def to_vtt(cues):
+    return 'WEBVTT\n\n' + ''.join(
+        '%s --> %s\n%s\n\n' % (vtt_timestamp(start), vtt_timestamp(end), text.replace('&', '&amp;').replace('<', '&lt;'))
+        for start, end, text in cues
+    )
+
+
+def to_json(cues):
+    return json.dumps(cues, ensure_ascii=False, separators=(',', ':'))
+
+
+def compiled_key(key, extension):
+    # Where the compiled forms of the subtitle file at `key` are stored.
+    return '%s.%s' % (key, extension)
+
+
+def compile_srt(key, cues):
+    # Stores `cues` next to the subtitle file at `key`, as a JSON array of
+    # [start, end, text] and as WebVTT, for players to load without parsing SRT.
+    for extension, content, content_type in (
+        ('json', to_json(cues), 'application/json; charset=utf-8'),
+        ('vtt', to_vtt(cues), 'text/vtt; charset=utf-8'),
+    ):
+        storage.upload(io.BytesIO(content.encode('utf-8')), compiled_key(key, extension), {
+            'ACL': 'public-read',
+            'ContentType': content_type,
+        })
+
+
+def upload_srt(fileobj, key, username):
+    # Validates an uploaded subtitle file, then stores it with its compiled forms.
+    # Returns the errors, in which case nothing is stored.
+    cues, errors = read_srt(fileobj)
+    if errors:
+        return errors
+
+    fileobj.seek(0)
+    storage.upload(fileobj, key, storage.upload_args(key, username))
+    compile_srt(key, cues)
+    return []
+
+
+def check_uploaded_srt(key):
+    # Same as upload_srt, for a file the client uploaded to the bucket directly.
+    # An invalid one is deleted.
+    body = storage.get_client().get_object(Bucket=settings.AWS_BUCKET, Key=key)['Body']
+    cues, errors = read_srt(body)
+    if errors:
+        storage.get_client().delete_object(Bucket=settings.AWS_BUCKET, Key=key)
+        return errors
+
+    compile_srt(key, cues)
+    return []
+
+
+def fetch_srt(url):
+    response = requests.get(url, timeout=settings.SUBTITLE_FETCH_TIMEOUT)
+    response.raise_for_status()
+    return response.content.decode('utf-8-sig', errors='replace')
+
+
+def clear_cues(video_ids):
+    # Drops the cues of replaced subtitle files; ingest_subtitles stores the new ones.
+    cue_ids = list(models.Cue.objects.filter(video__in=video_ids).values_list('pk', flat=True))
+    models.Cue.objects.filter(pk__in=cue_ids).delete()
+    index_cues(cue_ids)
+    models.Video.objects.filter(pk__in=video_ids).update(cues_ingested=False)
+    keys = [PAIRS_PREFIX + str(video_id) for video_id in video_ids]
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def ingest_cues(video):
+    # Replaces the cues of `video` by the ones of its current subtitle files.
+    # Downloads happen before the transaction so a slow S3 does not hold it open.
+    # None when the files were replaced meanwhile; the video is still to ingest.
+    tracks = [
+        (language, parse_srt(fetch_srt(url)))
+        for language, url in ((models.Cue.VI, video.vi_sub), (models.Cue.EN, video.en_sub))
+        if url
+    ]
+
+    with transaction.atomic():
+        clear_cues([video.id])
+        if not models.Video.objects\
+                .filter(pk=video.id, vi_sub=video.vi_sub, en_sub=video.en_sub)\
+                .update(cues_ingested=True):
+            transaction.set_rollback(True)
+            return None
+        models.Cue.objects.bulk_create([
+            models.Cue(video=video, language=language, start=start, end=end, text=text)
+            for language, cues in tracks
+            for start, end, text in cues
+        ], batch_size=500)
+        index_cues(models.Cue.objects.filter(video=video).values_list('pk', flat=True))
+
+    return sum(len(cues) for language, cues in tracks)
+
+
+def search_cues(query, language=None, first=10, cues_per_video=5):
+    # [(video, cues)] for the published videos whose cues match `query`, best match
+    # first; the cues of each video are in playback order.
+    # The filters go into the index query so that they apply before the limit.
+    cues = models.Cue.objects.filter(video__is_published=True)
+    if language:
+        cues = cues.filter(language=language)
+    cue_ids = search(CUE_INDEX, query, within=cues)
+    if not cue_ids:
+        return []
+
+    # in_bulk splits the ids in batches under the SQLite parameter limit.
+    cues = models.Cue.objects.in_bulk(cue_ids)
+    matches = OrderedDict()
+    for cue in (cues[cue_id] for cue_id in cue_ids):
+        matches.setdefault(cue.video_id, []).append(cue)
+
+    video_ids = list(matches)[:first]
+    videos = models.Video.objects.in_bulk(video_ids)
+    return [
+        (videos[video_id], sorted(matches[video_id][:cues_per_video], key=lambda cue: cue.start))
+        for video_id in video_ids
+    ]
+
+
+def align_cues(vi_cues, en_cues):
+    # [(start, end, vi, en)] in order of start: each Vietnamese cue with the text of
+    # the English cues whose middle falls inside it, then the English cues that
+    # fall in none on their own. `vi_cues` are in order of start.
+    starts = [start for start, end, text in vi_cues]
+    # reach[i] is the latest end among vi_cues[:i + 1]: going back from the last
+    # cue starting before a time, none can contain it past where reach drops to it.
+    reach = []
+    for start, end, text in vi_cues:
+        reach.append(max(end, reach[-1]) if reach else end)
+
+    matched = [[] for cue in vi_cues]
+    pairs = []
+    for start, end, text in en_cues:
+        middle = (start + end) // 2
+        idx = bisect_right(starts, middle) - 1
+        while idx >= 0 and reach[idx] > middle and vi_cues[idx][1] <= middle:
+            idx -= 1
+        if idx >= 0 and reach[idx] > middle:
+            matched[idx].append(text)
+        else:
+            pairs.append((start, end, '', text))
+
+    pairs.extend((start, end, text, '\n'.join(en)) for (start, end, text), en in zip(vi_cues, matched))
+    pairs.sort(key=lambda pair: pair[0])
+    return pairs
+
+
+def get_cue_pairs(video_ids):
+    # [(starts, reach, pairs)] of the aligned stored cues of each video, cached; no
+    # pairs until ingest_subtitles has stored them. reach[i] is the latest end among
+    # pairs[:i + 1], which unlike ends is sorted.
+    keys = {video_id: PAIRS_PREFIX + str(video_id) for video_id in video_ids}
+    stored = cache.get_many(list(keys.values()))
+    missing = [video_id for video_id in video_ids if keys[video_id] not in stored]
+    if missing:
+        tracks = {video_id: {models.Cue.VI: [], models.Cue.EN: []} for video_id in missing}
+        cues = models.Cue.objects\
+            .filter(video__in=missing)\
+            .order_by('start', 'pk')\
+            .values_list('video', 'language', 'start', 'end', 'text')
+        for video_id, language, start, end, text in cues:
+            tracks[video_id][language].append((start, end, text))
+
+        built = {}
+        for video_id in missing:
+            pairs = align_cues(tracks[video_id][models.Cue.VI], tracks[video_id][models.Cue.EN])
+            reach = []
+            for start, end, vi, en in pairs:
+                reach.append(max(end, reach[-1]) if reach else end)
+            built[keys[video_id]] = ([pair[0] for pair in pairs], reach, pairs)
+        cache.set_many(built, settings.SUBTITLE_CACHE_TIMEOUT)
+        stored.update(built)
+    return [stored[keys[video_id]] for video_id in video_ids]
+
+
+def cue_window(cue_pairs, start, end):
+    # The pairs of get_cue_pairs shown at some point in [start, end) milliseconds,
+    # found by binary search.
+    if end <= start:
+        return []
+    starts, reach, pairs = cue_pairs
+    end = min(end, start + settings.SUBTITLE_WINDOW_MAX)
+    lo = bisect_right(reach, start)
+    hi = bisect_left(starts, end)
+    return [pair for pair in pairs[lo:hi] if pair[1] > start]
@@ -0,0 +1,449 @@
+import io
+import json
+import os
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest import mock
+from urllib.parse import urlparse, parse_qs
+
+from PIL import Image
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils.six import StringIO
+from rest_framework.authtoken.models import Token
+
+from . import images, models, storage, youtube
+from .management.commands import refresh_youtube_metadata
+from .importer import import_videos
+from .relations import get_target_ids
+from .search import VIDEO_INDEX, filter_by_search, index_videos
+from .subtitles import align_cues, cue_window, get_cue_pairs
+
+
+def youtube_item(video_id, duration='PT1M5S', title='Title'):
+    return {
+        'id': video_id,
+        'contentDetails': {'duration': duration},
+        'snippet': {
+            'title': title,
+            'description': '',
+            'thumbnails': {'high': {'url': 'https://i.ytimg.com/vi/%s/hqdefault.jpg' % video_id}},
+        },
+    }
+
+
+class FakeYouTube(BaseHTTPRequestHandler):
+    # Answers /videos like the Data API does for the items in `videos`, and keeps
+    # the ids asked for in each call.
+    videos = {}
+    calls = []
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        ids = parse_qs(url.query)['id'][0].split(',')
+        FakeYouTube.calls.append(ids)
+        body = json.dumps({'items': [self.videos[video_id] for video_id in ids if video_id in self.videos]}).encode('utf-8')
+        self.send_response(200 if url.path.endswith('/videos') else 404)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class YouTubeTestCase(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super(YouTubeTestCase, cls).setUpClass()
+        cls.server = HTTPServer(('127.0.0.1', 0), FakeYouTube)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.api = override_settings(YOUTUBE_API_URL='http://127.0.0.1:%d' % cls.server.server_port)
+        cls.api.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.api.disable()
+        cls.server.shutdown()
+        cls.server.server_close()
+        super(YouTubeTestCase, cls).tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        FakeYouTube.videos = {'id%d' % idx: youtube_item('id%d' % idx) for idx in range(120)}
+        FakeYouTube.calls = []
+
+
+class YouTubeClientTest(YouTubeTestCase):
+    def test_get_videos_batches_ids(self):
+        videos = youtube.get_videos(['id%d' % idx for idx in range(120)] + ['missing'])
+
+        self.assertEqual(len(videos), 120)
+        self.assertEqual([len(ids) for ids in FakeYouTube.calls], [50, 50, 21])
+        self.assertEqual(youtube.quota_used(), 3)
+
+    def test_get_videos_caches_items(self):
+        youtube.get_videos(['id1', 'id2'])
+        videos = youtube.get_videos(['id2', 'id1', 'id3'])
+
+        self.assertEqual(set(videos), {'id1', 'id2', 'id3'})
+        self.assertEqual(FakeYouTube.calls, [['id1', 'id2'], ['id3']])
+
+    def test_duration_and_thumbnail(self):
+        item = youtube.get_videos(['id7'])['id7']
+
+        self.assertEqual(youtube.get_duration(item), 65)
+        self.assertEqual(youtube.get_thumbnail(item), 'https://i.ytimg.com/vi/id7/hqdefault.jpg')
+
+
+class YouTubeVideosApiTest(YouTubeTestCase):
+    def setUp(self):
+        super(YouTubeVideosApiTest, self).setUp()
+        user = User.objects.create(username='poster')
+        models.Profile.objects.create(user=user, role=models.Profile.POSTER)
+        self.token = Token.objects.create(user=user).key
+
+    def get(self, ids, **headers):
+        return self.client.get('/api/youtube_videos/', {'ids': ','.join(ids)}, **headers)
+
+    def test_requires_permission(self):
+        response = self.get(['id1'])
+
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(FakeYouTube.calls, [])
+
+    def test_returns_videos(self):
+        response = self.get(['id1', 'missing'], HTTP_AUTHORIZATION='Token ' + self.token)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['videos']['id1']['duration'], 65)
+        self.assertNotIn('missing', response.json()['videos'])
+
+    def test_limits_ids_to_one_call(self):
+        response = self.get(['id%d' % idx for idx in range(youtube.BATCH_SIZE + 1)], HTTP_AUTHORIZATION='Token ' + self.token)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(FakeYouTube.calls, [])
+
+
+class RefreshYouTubeMetadataTest(YouTubeTestCase):
+    def setUp(self):
+        super(RefreshYouTubeMetadataTest, self).setUp()
+        user = User.objects.create(username='admin')
+        source = models.Source.objects.create(slug='ted', name='TED', image='image')
+        for idx in range(120):
+            models.Video.objects.create(
+                slug='video%d' % idx, title='Video %d' % idx, description='', image='image',
+                video_id='id%d' % idx, duration=65 if idx % 2 else 0, vi_sub='', en_sub='',
+                created_by=user, source=source)
+        FakeYouTube.videos.pop('id0')
+
+    def refresh(self, *args):
+        call_command('refresh_youtube_metadata', *args, stdout=StringIO())
+
+    def test_updates_changed_durations(self):
+        self.refresh('--workers', '2')
+
+        self.assertEqual(models.Video.objects.filter(duration=65).count(), 119)
+        self.assertEqual(models.Video.objects.get(video_id='id0').duration, 0)
+        self.assertEqual(sorted(len(ids) for ids in FakeYouTube.calls), [20, 50, 50])
+        self.assertEqual(youtube.quota_used(), 3)
+
+    def test_stops_at_budget(self):
+        youtube.spend_quota(8)
+        self.refresh('--workers', '2', '--budget', '10')
+
+        self.assertEqual(len(FakeYouTube.calls), 2)
+        self.assertEqual(models.Video.objects.filter(duration=0).count(), 11)
+        self.assertEqual(models.YouTubeQuota.objects.get().units, 10)
+
+    def test_updates_in_batches(self):
+        changes = {video.pk: {'duration': 30} for video in models.Video.objects.all()}
+
+        with mock.patch.object(refresh_youtube_metadata, 'UPDATE_BATCH_SIZE', 50), self.assertNumQueries(3):
+            refresh_youtube_metadata.bulk_update(changes, 'duration')
+        self.assertEqual(models.Video.objects.filter(duration=30).count(), 120)
+
+
+class FakeS3:
+    # The calls of the S3 client images.py and S3UploadHandler make, on objects kept in a dict.
+    def __init__(self):
+        self.objects = {}
+        self.uploads = []
+        self.parts = {}
+        self.aborted = []
+
+    def list_objects_v2(self, Bucket, Prefix):
+        return {'Contents': [{'Key': key} for key in sorted(self.objects) if key.startswith(Prefix)]}
+
+    def get_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise Exception("NoSuchKey")
+        return {'Body': io.BytesIO(self.objects[Key])}
+
+    def upload_fileobj(self, fileobj, bucket, key, ExtraArgs=None, Config=None):
+        self.uploads.append(key)
+        self.objects[key] = fileobj.read()
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.uploads.append(Key)
+        self.objects[Key] = Body
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        self.parts['upload-' + Key] = []
+        return {'UploadId': 'upload-' + Key}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self.parts[UploadId].append(Body)
+        return {'ETag': '"%d"' % PartNumber}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        parts = self.parts.pop(UploadId)
+        assert [part['PartNumber'] for part in MultipartUpload['Parts']] == list(range(1, len(parts) + 1))
+        self.uploads.append(Key)
+        self.objects[Key] = b''.join(parts)
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.parts.pop(UploadId)
+        self.aborted.append(Key)
+
+
+def png(width, height):
+    output = io.BytesIO()
+    Image.new('RGBA', (width, height), (255, 0, 0, 128)).save(output, 'PNG')
+    return output.getvalue()
+
+
+class ImageVariantsTest(TestCase):
+    def setUp(self):
+        self.s3 = FakeS3()
+        self.s3.objects['images/photo.png'] = png(1600, 900)
+        patcher = mock.patch.object(storage, 'get_client', return_value=self.s3)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_generates_missing_sizes_once(self):
+        made = images.generate_variants('images/photo.png')
+
+        self.assertEqual(sorted(made), sorted(settings.IMAGE_SIZES))
+        self.assertEqual(images.get_sizes(['images/photo.png'])['images/photo.png'], set(settings.IMAGE_SIZES))
+        small = Image.open(io.BytesIO(self.s3.objects[images.variant_key('images/photo.png', 'small')]))
+        self.assertEqual(small.size, (settings.IMAGE_SIZES['small'], 90))
+
+        uploads = len(self.s3.uploads)
+        self.assertEqual(images.generate_variants('images/photo.png'), [])
+        self.assertEqual(len(self.s3.uploads), uploads)
+
+    def test_command_takes_pending_uploads(self):
+        images.enqueue('images/photo.png')
+        images.enqueue('images/missing.jpg')
+        images.enqueue('subtitles/talk.srt')
+        call_command('generate_image_variants', stdout=StringIO(), stderr=StringIO())
+
+        self.assertEqual(len(self.s3.uploads), len(settings.IMAGE_SIZES))
+        self.assertEqual(list(models.PendingImage.objects.values_list('key', 'attempts')), [('images/missing.jpg', 1)])
+
+        call_command('generate_image_variants', stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(len(self.s3.uploads), len(settings.IMAGE_SIZES))
+
+    def test_get_sizes_in_batches(self):
+        keys = ['images/%d.jpg' % idx for idx in range(images.MAX_BATCH_SIZE * 2 + 1)]
+        models.ImageVariant.objects.create(key=keys[-1], size='small')
+
+        with self.assertNumQueries(3):
+            sizes = images.get_sizes(keys)
+        self.assertEqual(sizes[keys[-1]], {'small'})
+        self.assertEqual(sizes[keys[0]], set())
+
+
+@override_settings(AWS_MULTIPART_CHUNKSIZE=100 * 1024)
+class UploadFileTest(TestCase):
+    def setUp(self):
+        self.s3 = FakeS3()
+        patcher = mock.patch.object(storage, 'get_client', return_value=self.s3)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        user = User.objects.create(username='poster')
+        models.Profile.objects.create(user=user, role=models.Profile.POSTER)
+        self.token = Token.objects.create(user=user).key
+
+    def upload(self, content):
+        response = self.client.post('/api/upload/', {'upload_file': SimpleUploadedFile('clip.mp4', content)},
+            HTTP_AUTHORIZATION='Token ' + self.token)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_puts_small_file(self):
+        content = os.urandom(50 * 1024)
+        result = self.upload(content)
+
+        self.assertTrue(result['is_success'])
+        self.assertEqual(self.s3.uploads, [result['detail'][len(storage.public_url('')):]])
+        self.assertTrue(self.s3.uploads[0].endswith('.mp4'))
+        self.assertEqual(self.s3.objects[self.s3.uploads[0]], content)
+
+    def test_streams_large_file_in_parts(self):
+        content = os.urandom(350 * 1024)
+        with mock.patch.object(self.s3, 'upload_part', wraps=self.s3.upload_part) as upload_part:
+            result = self.upload(content)
+
+        self.assertTrue(result['is_success'])
+        self.assertEqual(self.s3.objects[self.s3.uploads[0]], content)
+        sizes = [len(call[1]['Body']) for call in upload_part.call_args_list]
+        self.assertGreater(len(sizes), 2)
+        self.assertTrue(all(size >= 100 * 1024 for size in sizes[:-1]))
+        self.assertEqual(self.s3.parts, {})
+
+    def test_aborts_failed_upload(self):
+        with mock.patch.object(self.s3, 'complete_multipart_upload', side_effect=Exception("Connection reset")):
+            result = self.upload(os.urandom(350 * 1024))
+
+        self.assertEqual(result, {'is_success': False, 'detail': 'Connection reset'})
+        self.assertEqual(len(self.s3.aborted), 1)
+        self.assertEqual(self.s3.parts, {})
+        self.assertEqual(self.s3.objects, {})
+
+
+class SearchTest(TestCase):
+    def setUp(self):
+        user = User.objects.create(username='admin')
+        for idx, title in enumerate(['Tiếng Việt', 'Học tiếng Việt', 'Việt Nam', 'Tiếng Anh', 'Tiếng Việt tiếng Việt']):
+            models.Video.objects.create(
+                slug='video%d' % idx, title=title, description='', image='image', video_id='id%d' % idx,
+                duration=60, vi_sub='', en_sub='', created_by=user, is_published=idx != 2)
+        index_videos(models.Video.objects.values_list('pk', flat=True))
+
+    def search(self, query):
+        videos = models.Video.objects.filter(is_published=True).order_by('slug')
+        return [video.slug for video in filter_by_search(videos, VIDEO_INDEX, query)]
+
+    def test_folds_and_filters(self):
+        self.assertEqual(sorted(self.search('tieng viet')), ['video0', 'video1', 'video4'])
+        self.assertEqual(self.search('viet nam'), [])
+        self.assertEqual(self.search('   '), ['video0', 'video1', 'video3', 'video4'])
+
+    def test_keeps_matches_past_the_limit(self):
+        with override_settings(SEARCH_RESULT_LIMIT=1):
+            slugs = self.search('tieng')
+
+        # The best ranked first, then the others in the order of the list
+        self.assertEqual(slugs, ['video4', 'video0', 'video1', 'video3'])
+
+
+def random_track(rng, count, length, longest):
+    # `count` cues in order of start, overlapping at random.
+    return sorted(
+        (start, start + rng.randint(1, longest), 'cue %d' % idx)
+        for idx, start in enumerate(rng.sample(range(length), count))
+    )
+
+
+class CueAlignmentTest(TestCase):
+    def test_pairs_under_overlapping_cues(self):
+        pairs = align_cues([(0, 10000, 'long'), (2000, 3000, 'short')], [(5000, 7000, 'en')])
+
+        self.assertEqual(pairs, [(0, 10000, 'long', 'en'), (2000, 3000, 'short', '')])
+
+    def test_align_matches_brute_force(self):
+        # An English cue goes with a Vietnamese cue that contains its middle if
+        # there is one, else stands alone.
+        rng = random.Random(3)
+        for trial in range(300):
+            vi = random_track(rng, 20, 60000, 8000)
+            en = random_track(rng, 20, 60000, 5000)
+            pairs = align_cues(vi, en)
+
+            self.assertEqual(sorted(pair[2] for pair in pairs if pair[2]), sorted(text for start, end, text in vi))
+            for start, end, text in en:
+                middle = (start + end) // 2
+                inside = [cue for cue in vi if cue[0] <= middle < cue[1]]
+                paired = [pair for pair in pairs if pair[2] and text in pair[3].split('\n')]
+                alone = [pair for pair in pairs if not pair[2] and pair[3] == text]
+                if inside:
+                    self.assertEqual(len(paired), 1, (trial, text))
+                    self.assertTrue(paired[0][0] <= middle < paired[0][1], (trial, text))
+                    self.assertEqual(alone, [])
+                else:
+                    self.assertEqual((paired, len(alone)), ([], 1), (trial, text))
+
+    def test_window_matches_brute_force(self):
+        rng = random.Random(2)
+        user = User.objects.create(username='admin')
+        video = models.Video.objects.create(
+            slug='video', title='Video', description='', image='image', video_id='id',
+            duration=3600, vi_sub='', en_sub='', created_by=user)
+        cues = [(models.Cue.VI, 0, 3600000, 'a cue over the whole video')]
+        for language in (models.Cue.VI, models.Cue.EN):
+            cues += [(language, start, end, text) for start, end, text in random_track(rng, 500, 3600000, 10000)]
+        models.Cue.objects.bulk_create([
+            models.Cue(video=video, language=language, start=start, end=end, text=text)
+            for language, start, end, text in cues
+        ])
+
+        cue_pairs = get_cue_pairs([video.id])[0]
+        pairs = cue_pairs[2]
+        self.assertEqual(len([pair for pair in pairs if pair[2]]), 501)
+        for _ in range(500):
+            start = rng.randint(0, 3700000)
+            end = start + rng.randint(1, settings.SUBTITLE_WINDOW_MAX)
+            expected = [pair for pair in pairs if pair[1] > start and pair[0] < end]
+            self.assertEqual(cue_window(cue_pairs, start, end), expected, (start, end))
+        self.assertEqual(cue_window(cue_pairs, 5000, 5000), [])
+
+
+class TargetIdsTest(TestCase):
+    def setUp(self):
+        self.ids = [models.Speaker.objects.create(slug='speaker%d' % idx, name='Speaker %d' % idx).pk for idx in range(2)]
+
+    def test_returns_unique_ids(self):
+        ids = [str(self.ids[1]), ' %d' % self.ids[0], self.ids[1]]
+
+        self.assertEqual(get_target_ids(models.Speaker, 'speakers', ids), [self.ids[1], self.ids[0]])
+
+    def test_rejects_other_values(self):
+        for value in ['²', '-1', '1.0', '', '9' * 30, str(max(self.ids) + 1)]:
+            with self.assertRaises(Exception) as raised:
+                get_target_ids(models.Speaker, 'speakers', [self.ids[0], value])
+            self.assertEqual(json.loads(str(raised.exception))['speakers'][0]['code'], 'invalid_choice')
+
+
+class ImportSubcategoriesTest(TestCase):
+    def setUp(self):
+        User.objects.create(username='admin')
+        for slug in ('music', 'science'):
+            category = models.Category.objects.create(slug=slug, name=slug, image='image')
+            models.SubCategory.objects.create(category=category, slug='talks', name='Talks', image='image')
+        models.SubCategory.objects.create(category=category, slug='space', name='Space', image='image')
+
+    def import_video(self, categories, subcategories):
+        item = {
+            'slug': 'video', 'title': 'Video', 'description': 'Description', 'image': 'image', 'video_id': 'id0',
+            'duration': 65, 'vi_sub': 'vi.srt', 'en_sub': 'en.srt', 'view_amount': 0, 'is_published': False,
+            'created_at': '2019-03-11T11:16:00.000000+07:00', 'published_at': '2019-03-11T11:16:00.000000+07:00',
+            'categories': categories, 'subcategories': subcategories,
+        }
+        return import_videos([item])[0]
+
+    def test_scopes_slugs_by_categories(self):
+        video, errors = self.import_video(['science'], ['talks', 'space'])
+
+        self.assertIsNone(errors)
+        self.assertEqual(
+            sorted(models.VideoSubCategory.objects.filter(video=video).values_list('subcategory__category__slug', 'subcategory__slug')),
+            [('science', 'space'), ('science', 'talks')])
+
+    def test_reports_ambiguous_slugs(self):
+        for categories in ([], ['music', 'science']):
+            video, errors = self.import_video(categories, ['talks'])
+            self.assertIsNone(video)
+            self.assertEqual(json.loads(errors)['subcategory'][0]['code'], 'ambiguous')
+
+        video, errors = self.import_video([], ['unknown'])
+        self.assertEqual(json.loads(errors)['subcategory'][0]['code'], 'invalid_choice')
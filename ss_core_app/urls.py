@@ -1,5 +1,6 @@
 from graphene_django.views import GraphQLView
 
+from django.conf import settings
 from django.conf.urls import url
 from django.views.decorators.csrf import csrf_exempt
 
@@ -9,9 +10,11 @@ from rest_framework.decorators import permission_classes, authentication_classes
 from rest_framework.settings import api_settings
 
 from .graphql.schema import schema
+from .graphql.cache import CachedGraphQLView
+from .graphql.persisted import PersistedQueryMixin
 from . import views, apis
 
-class DRFAuthenticatedGraphQLView(GraphQLView):
+class DRFAuthenticatedGraphQLView(PersistedQueryMixin, GraphQLView):
     def parse_body(self, request):
         if isinstance(request, rest_framework.request.Request):
             return request.data
@@ -25,9 +28,14 @@ class DRFAuthenticatedGraphQLView(GraphQLView):
         view = api_view(['GET', 'POST'])(view)
         return view
 
+
+class PublicGraphQLView(PersistedQueryMixin, CachedGraphQLView):
+    registered_only = settings.GRAPHQL_REGISTERED_QUERIES_ONLY
+
+
 urlpatterns = [
     url(r'^graphql_token', DRFAuthenticatedGraphQLView.as_view(schema=schema)),
-    url(r'^graphql', csrf_exempt(GraphQLView.as_view(graphiql=True, schema=schema))),
+    url(r'^graphql', csrf_exempt(PublicGraphQLView.as_view(graphiql=True, schema=schema))),
 
     # Static
     url(r'^gioi-thieu/$', views.faq, name='faq'),
@@ -37,9 +45,16 @@ urlpatterns = [
     url(r'^give/$', views.give, name='give'),
     url(r'^join/$', views.join, name='join'),
     url(r'^ss/$', views.video_list, name='video_list'),
+    url(r'^sitemap\.xml$', views.sitemap_index, name='sitemap_index'),
+    url(r'^sitemap-pages\.xml$', views.sitemap_pages, name='sitemap_pages'),
+    url(r'^sitemap-(?P<section>[a-z]+)-(?P<number>[0-9]+)\.xml$', views.sitemap, name='sitemap'),
 
     # APIs
     url(r'^api/user/$', apis.get_user),
     url(r'^api/upload/$', apis.upload_file),
+    url(r'^api/upload/presign/$', apis.presign_upload),
+    url(r'^api/upload/confirm/$', apis.confirm_upload),
     url(r'^api/youtube_duration/$', apis.youtube_duration),
+    url(r'^api/youtube_videos/$', apis.youtube_videos),
+    url(r'^api/export/$', apis.export_catalog),
 ]
@@ -1,29 +1,39 @@
-from re import sub
+import re
+import unicodedata
+from functools import lru_cache
 from django.utils.timezone import now
 from .models import Video, Profile
 
 
+VIETNAMESE_LETTERS = {
+    'a': 'àáảãạăắằẵặẳâầấậẫẩ',
+    'd': 'đ',
+    'e': 'èéẻẽẹêềếểễệ',
+    'i': 'ìíỉĩị',
+    'o': 'òóỏõọôồốổỗộơờớởỡợ',
+    'u': 'ùúủũụưừứửữự',
+    'y': 'ỳýỷỹỵ',
+}
+
+# Every Vietnamese letter to its ASCII base, in lower and upper case.
+FOLD_TABLE = {}
+for base, letters in VIETNAMESE_LETTERS.items():
+    for letter in letters:
+        FOLD_TABLE[ord(letter)] = base
+        FOLD_TABLE[ord(letter.upper())] = base.upper()
+
+NON_WORD = re.compile(r'\W+')
+
+
 def convert(text):
-    patterns = {
-        '[àáảãạăắằẵặẳâầấậẫẩ]': 'a',
-        '[đ]': 'd',
-        '[èéẻẽẹêềếểễệ]': 'e',
-        '[ìíỉĩị]': 'i',
-        '[òóỏõọôồốổỗộơờớởỡợ]': 'o',
-        '[ùúủũụưừứửữự]': 'u',
-        '[ỳýỷỹỵ]': 'y'
-    }
-
-    output = text
-    for regex, replace in patterns.items():
-        output = sub(regex, replace, output)
-        # deal with upper case
-        output = sub(regex.upper(), replace.upper(), output)
-    return output
+    # Composes decomposed (NFD) input first, so "a" + U+0301 folds like "á".
+    return unicodedata.normalize('NFC', text).translate(FOLD_TABLE)
 
 
+# Tags and names repeat a lot across videos.
+@lru_cache(maxsize=4096)
 def name_to_slug(name):
-    slug = sub('\W+', '-', convert(name).lower()).strip('-')
+    slug = NON_WORD.sub('-', convert(name).lower()).strip('-')
 
     return slug
 
@@ -67,5 +77,5 @@ def get_permission(action, user, extras=None):
             Profile.ADMINISTRATOR, 
         ]
 
-    if action == 'import':
+    if action in ['import', 'export']:
         return user.is_staff
\ No newline at end of file
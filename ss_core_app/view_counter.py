@@ -0,0 +1,101 @@
+import atexit
+import logging
+import os
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+
+from . import models
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCounter:
+    # Collects view increments per video in this process and writes them behind as
+    # `view_amount = view_amount + n`, so concurrent plays never lose an increment and
+    # a play does not rewrite the whole video row. Pending views are flushed after
+    # VIEW_COUNT_FLUSH_INTERVAL seconds, once VIEW_COUNT_FLUSH_THRESHOLD of them are
+    # waiting, and at exit.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.pending = Counter()
+        self.total = 0
+        self.timer = None
+
+    def add(self, video_id, amount=1):
+        # Returns the views of `video_id` that were not written before this call,
+        # this one included.
+        with self.lock:
+            # A forked worker inherits the buffer of its parent but not its timer thread.
+            if self.pid != os.getpid():
+                self.reset()
+
+            self.pending[video_id] += amount
+            self.total += amount
+            pending = self.pending[video_id]
+
+            flush = self.total >= settings.VIEW_COUNT_FLUSH_THRESHOLD or settings.VIEW_COUNT_FLUSH_INTERVAL <= 0
+            if not flush:
+                self.start_timer()
+
+        if flush:
+            self.flush()
+        return pending
+
+    def start_timer(self):
+        # Called with the lock held.
+        if self.timer is None and settings.VIEW_COUNT_FLUSH_INTERVAL > 0:
+            self.timer = threading.Timer(settings.VIEW_COUNT_FLUSH_INTERVAL, self.flush_in_background)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def flush(self):
+        with self.lock:
+            if self.pid != os.getpid():
+                self.reset()
+            pending = self.pending
+            self.pending = Counter()
+            self.total = 0
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+
+        if not pending:
+            return
+
+        # One UPDATE per distinct increment: most videos get the same few.
+        videos_by_amount = defaultdict(list)
+        for video_id, amount in pending.items():
+            videos_by_amount[amount].append(video_id)
+
+        try:
+            with transaction.atomic():
+                for amount, video_ids in videos_by_amount.items():
+                    models.Video.objects.filter(pk__in=video_ids).update(view_amount=F('view_amount') + amount)
+        except Exception:
+            # Keep the views for the next flush instead of dropping them, and make
+            # sure there is one even if no other view comes. Not raised: this runs
+            # on the request that happened to reach the threshold.
+            logger.exception("Could not write %d pending views.", sum(pending.values()))
+            with self.lock:
+                self.pending.update(pending)
+                self.total += sum(pending.values())
+                self.start_timer()
+
+    def flush_in_background(self):
+        try:
+            self.flush()
+        finally:
+            # The timer thread has its own connection, which nothing else would close.
+            connection.close()
+
+
+view_counter = ViewCounter()
+atexit.register(view_counter.flush)
@@ -1,5 +1,7 @@
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import render, redirect
 from .models import Video
+from . import sitemap as sitemaps
 
 def faq(request):
     return render(request, 'faq.html', {})
@@ -22,5 +24,20 @@ def dich_thuat(request):
 
 
 def video_list(request):
-    videos = Video.objects.filter(is_published=True).order_by('-published_at')
+    videos = Video.objects.filter(is_published=True).only('slug', 'title').order_by('-published_at')
     return render(request, 'video_list.html', {"videos": videos})
+
+
+def sitemap_index(request):
+    return StreamingHttpResponse(sitemaps.render_index(), content_type='application/xml; charset=utf-8')
+
+
+def sitemap_pages(request):
+    return StreamingHttpResponse(sitemaps.render_pages(), content_type='application/xml; charset=utf-8')
+
+
+def sitemap(request, section, number):
+    content = sitemaps.render_shard(section, int(number))
+    if content is None:
+        raise Http404()
+    return StreamingHttpResponse(content, content_type='application/xml; charset=utf-8')
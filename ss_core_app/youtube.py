@@ -0,0 +1,99 @@
+import pytz
+import requests
+from requests.adapters import HTTPAdapter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import models
+from .utils import youtube_duration_to_second
+
+KEY_PREFIX = 'youtube:video:'
+
+# The most ids the videos endpoint accepts in one call.
+BATCH_SIZE = 50
+
+# One keep-alive connection pool per process, shared by every thread.
+session = requests.Session()
+session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=settings.YOUTUBE_POOL_SIZE))
+session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=settings.YOUTUBE_POOL_SIZE))
+
+
+def quota_day():
+    # The API quota resets at midnight Pacific time.
+    return timezone.now().astimezone(pytz.timezone('America/Los_Angeles')).date()
+
+
+def spend_quota(units):
+    # Counted in the database, so that every process and server adds to one total.
+    day = quota_day()
+    if models.YouTubeQuota.objects.filter(day=day).update(units=F('units') + units):
+        return
+    try:
+        with transaction.atomic():
+            models.YouTubeQuota.objects.create(day=day, units=units)
+    except IntegrityError:
+        # Created in between
+        models.YouTubeQuota.objects.filter(day=day).update(units=F('units') + units)
+
+
+def quota_used():
+    # Units spent today by every process
+    return models.YouTubeQuota.objects.filter(day=quota_day()).values_list('units', flat=True).first() or 0
+
+
+def fetch_videos(ids):
+    # One call of at most BATCH_SIZE ids, costing one quota unit. Returns
+    # {id: item} of the ones found.
+    spend_quota(1)
+    return request_videos(ids)
+
+
+def request_videos(ids):
+    # fetch_videos without counting the unit, for callers that count the calls
+    # they make themselves.
+    response = session.get(
+        settings.YOUTUBE_API_URL.rstrip('/') + '/videos',
+        params={
+            'part': 'contentDetails,snippet',
+            'id': ','.join(ids),
+            'key': settings.YOUTUBE_API_KEY,
+            'maxResults': BATCH_SIZE,
+        },
+        timeout=settings.YOUTUBE_FETCH_TIMEOUT,
+    )
+    if response.status_code != 200:
+        raise Exception("YouTube API responded %d: %s" % (response.status_code, response.text[:200]))
+    return {item['id']: item for item in response.json().get('items', [])}
+
+
+def get_videos(ids):
+    # {id: item} with the contentDetails and snippet of the videos found, read from
+    # the cache or fetched BATCH_SIZE ids per call. Missing videos are left out.
+    ids = list(dict.fromkeys(video_id.strip() for video_id in ids if video_id and video_id.strip()))
+    cached = cache.get_many([KEY_PREFIX + video_id for video_id in ids])
+    videos = {video_id: cached[KEY_PREFIX + video_id] for video_id in ids if KEY_PREFIX + video_id in cached}
+
+    missing = [video_id for video_id in ids if video_id not in videos]
+    for start in range(0, len(missing), BATCH_SIZE):
+        fetched = fetch_videos(missing[start:start + BATCH_SIZE])
+        cache.set_many({KEY_PREFIX + video_id: item for video_id, item in fetched.items()}, settings.YOUTUBE_CACHE_TIMEOUT)
+        videos.update(fetched)
+
+    return videos
+
+
+def get_duration(item):
+    return youtube_duration_to_second(item['contentDetails']['duration'])
+
+
+def get_thumbnail(item):
+    # The largest one available
+    thumbnails = item['snippet'].get('thumbnails', {})
+    for size in ('maxres', 'standard', 'high', 'medium', 'default'):
+        if size in thumbnails:
+            return thumbnails[size]['url']
+    return ''